@@ -32,6 +32,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'shop',
 ]
 
@@ -138,6 +139,8 @@ CELERY_BROKER_URL = env('CELERY_BROKER_URL')
 
 CELERY_RESULT_BACKEND = env('CELERY_RESULT_BACKEND')
 
+REDIS_URL = env('REDIS_URL')
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -1,7 +1,6 @@
-import threading
-from datetime import datetime
+from dataclasses import replace
+from decimal import Decimal
 
-import openpyxl
 from aiogram import F, Router
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command, StateFilter
@@ -14,12 +13,18 @@ from aiogram.types import (
 )
 
 from bot.filters import IsChatMember
-from bot.handlers.utils import add_order, send_or_update_product_message
+from bot.handlers.utils import (
+    edit_message,
+    get_page_cursor,
+    send_or_update_product_message,
+)
 from bot.keyboards.utils import get_cart_keyboard, get_product_detail_keyboard
 from bot.loader import logger
+from bot.services import cart_pricing, carts, edit_coalescer
+from bot.services.cart_pricing import WHOLE_CART
 from bot.settings import settings
 from bot.states import CatalogState
-from shop.models import Product
+from shop.models import Client, Order, OrderItem
 
 router = Router()
 router.message.filter(IsChatMember())
@@ -28,10 +33,10 @@ router.message.filter(IsChatMember())
 @router.message(Command('cart'))
 @router.message(F.text == 'Корзина')
 async def display_cart(msg: Message, state: FSMContext):
-    await state.update_data(product_message_id=None, page=1)
-    cart = await state.get_value('cart', {})
+    cart = await carts.get(msg.from_user.id)
 
     if not cart:
+        await state.update_data(product_message_id=None)
         await msg.answer(
             'Ваша корзина пуста.\n'
             'Перейти в каталог - /catalog',
@@ -42,23 +47,22 @@ async def display_cart(msg: Message, state: FSMContext):
         'Ваша корзина',
         reply_markup=await get_cart_keyboard(cart),
     )
-    await state.update_data(cart_message_id=message.message_id)
-
+    await state.update_data(
+        product_message_id=None,
+        cart_message_id=message.message_id,
+    )
 
-@router.callback_query(F.data.in_(('cart_previous', 'cart_next')))
-async def change_cart_page(query: CallbackQuery, state: FSMContext):
-    data = await state.get_data()
-    cart = data.get('cart', {})
-    page = data.get('page', 1)
 
-    if query.data == 'cart_previous':
-        page -= 1
-    else:
-        page += 1
-    await state.update_data(page=page)
+@router.callback_query(F.data.startswith(('cart_previous', 'cart_next')))
+async def change_cart_page(query: CallbackQuery):
+    cart = await carts.get(query.from_user.id)
 
-    await query.message.edit_reply_markup(
-        reply_markup=await get_cart_keyboard(cart, page),
+    await edit_message(
+        query.message,
+        reply_markup=await get_cart_keyboard(
+            cart,
+            **get_page_cursor(query.data),
+        ),
     )
 
 
@@ -89,128 +93,130 @@ async def buy(query: CallbackQuery, state: FSMContext):
 async def set_delivery_location(msg: Message, state: FSMContext):
     await state.update_data(delivery_location=msg.text)
     data = await state.get_data()
-    cart = data.get('cart')
     buy_whole_cart = data.get('buy_whole_cart')
+    scope = WHOLE_CART if buy_whole_cart else f'product_{data["product_id"]}'
+    snapshot = await cart_pricing.price_scope(
+        await carts.get(msg.from_user.id),
+        scope,
+    )
     test_card_info = (
         'Для оплаты используйте данные тестовой карты: '
         '1111 1111 1111 1026, 12/22, 000'
     )
 
-    if buy_whole_cart:
-        amount = sum(
-            [
-                int(product.price * 100) * cart.get(str(product.pk))
-                async for product in Product.objects.filter(pk__in=cart.keys())
-            ],
+    await state.set_state(None)
+    if not snapshot.items:
+        await msg.answer(
+            'Товар не найден в корзине.\n'
+            'Перейти в корзину - /cart',
         )
+        return
 
-        if amount > settings.MAX_AMOUNT:
-            await state.set_state(None)
+    if snapshot.amount > settings.MAX_AMOUNT:
+        if buy_whole_cart:
             await msg.answer(
                 'Сумма покупки превышает 250 000 ₽.\n.'
                 'Попробуйте оплатить товары отдельно.',
             )
-            return
-
-        await state.set_state(None)
-        await msg.bot.send_invoice(
-            msg.chat.id,
-            'Покупка',
-            f'Вы оплачиваете всю корзину.\n{test_card_info}',
-            'whole_cart',
-            settings.CURRENCY,
-            [LabeledPrice(label=settings.CURRENCY, amount=amount)],
-            provider_token=settings.PROVIDER_TOKEN,
-        )
+        else:
+            await msg.answer(
+                'Сумма покупки превышает 250 000 ₽.\n'
+                'Попробуйте уменьшить количество товара',
+            )
         return
 
-    product_id = data.get('product_id')
-    product = await Product.objects.aget(pk=product_id)
-    product_count = cart.get(str(product_id))
-    amount = int(product.price * 100) * product_count
-
-    if amount > settings.MAX_AMOUNT:
-        await state.set_state(None)
-        await msg.answer(
-            'Сумма покупки превышает 250 000 ₽.\n'
-            'Попробуйте уменьшить количество товара',
+    if buy_whole_cart:
+        description = f'Вы оплачиваете всю корзину.\n{test_card_info}'
+    else:
+        item = snapshot.items[0]
+        description = (
+            f'Вы оплачиваете {item.title} ({item.count} шт.).'
+            f'\n{test_card_info}'
         )
-        return
 
-    await state.set_state(None)
+    # the address is frozen with the prices, the state may change
+    # before the payment arrives
+    snapshot = replace(snapshot, delivery_address=msg.text)
     await msg.bot.send_invoice(
         msg.chat.id,
         'Покупка',
-        f'Вы оплачиваете {product.title} ({product_count} шт.).'
-        f'\n{test_card_info}',
-        f'product_{product_id}',
+        description,
+        await cart_pricing.freeze(snapshot, scope),
         settings.CURRENCY,
-        [LabeledPrice(label=settings.CURRENCY, amount=amount)],
+        [LabeledPrice(label=settings.CURRENCY, amount=snapshot.amount)],
         provider_token=settings.PROVIDER_TOKEN,
     )
 
 
 @router.pre_checkout_query()
 async def accept_pre_checkout_query(query: PreCheckoutQuery):
+    snapshot = await cart_pricing.get(query.invoice_payload)
+    if snapshot is None or snapshot.amount != query.total_amount:
+        await query.answer(
+            False,
+            error_message='Счёт устарел, оформите покупку заново.',
+        )
+        return
     await query.answer(True)
 
 
 @router.message(F.successful_payment)
 async def on_successful_payment(msg: Message, state: FSMContext):
-    logger.info(f'Successful payment: {msg.successful_payment}')
+    payment = msg.successful_payment
+    logger.info(f'Successful payment: {payment}')
+
+    scope = cart_pricing.get_scope(payment.invoice_payload)
+    snapshot = await cart_pricing.pop(payment.invoice_payload)
+    if snapshot is None:
+        logger.warning(
+            f'Price snapshot of the invoice {payment.invoice_payload} '
+            f'was not found, the cart is priced again',
+        )
+        snapshot = replace(
+            await cart_pricing.price_scope(
+                await carts.get(msg.from_user.id),
+                scope,
+            ),
+            delivery_address=await state.get_value('delivery_location'),
+        )
 
-    data = await state.get_data()
-    cart = data.get('cart')
-    delivery_location = data.get('delivery_location')
-    order_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-    file_lock = threading.Lock()
-    with file_lock:
-        wb = openpyxl.load_workbook(settings.ORDERS_FILE)
-        sheet = wb.active
-
-        if msg.successful_payment.invoice_payload == 'whole_cart':
-            async for product in Product.objects.filter(pk__in=cart.keys()):
-                product_count = cart.get(str(product.pk))
-                add_order(
-                    sheet,
-                    msg,
-                    product=product,
-                    product_count=product_count,
-                    amount=f'{(product.price * product_count):,.2f}',
-                    delivery_location=delivery_location,
-                    order_date=order_date,
-                )
-            wb.save(settings.ORDERS_FILE)
-
-            await state.update_data(buy_whole_cart=None)
-            await msg.answer(
-                f'Поздравляем c покупкой '
-                f'на сумму {msg.successful_payment.total_amount / 100:,.2f} '
-                f'₽!',
-            )
-        else:
-            product = await Product.objects.aget(
-                pk=int(msg.successful_payment.invoice_payload.split('_')[-1]),
-            )
-            product_count = cart.get(str(product.pk))
-            add_order(
-                sheet,
-                msg,
-                product=product,
-                product_count=product_count,
-                amount=f'{msg.successful_payment.total_amount / 100:,.2f}',
-                delivery_location=delivery_location,
-                order_date=order_date,
+    client, _ = await Client.objects.create_or_update_from_tg_user(
+        msg.from_user,
+    )
+    _, created = await Order.objects.create_from_payment(
+        client=client,
+        payment=payment,
+        delivery_address=snapshot.delivery_address,
+        items=[
+            OrderItem(
+                product_id=item.product_id,
+                title=item.title,
+                price=Decimal(item.price) / 100,
+                count=item.count,
             )
-            wb.save(settings.ORDERS_FILE)
+            for item in snapshot.items
+        ],
+    )
+    if not created:
+        logger.warning(
+            f'Payment {payment.telegram_payment_charge_id} '
+            f'was already saved',
+        )
+        return
 
-            await msg.answer(
-                f'Поздравляем c покупкой {product.title} '
-                f'({product_count} шт.) '
-                f'на сумму {msg.successful_payment.total_amount / 100:,.2f} '
-                f'₽!',
-            )
+    if scope == WHOLE_CART:
+        await state.update_data(buy_whole_cart=None)
+        await msg.answer(
+            f'Поздравляем c покупкой '
+            f'на сумму {payment.total_amount / 100:,.2f} ₽!',
+        )
+    else:
+        item = snapshot.items[0]
+        await msg.answer(
+            f'Поздравляем c покупкой {item.title} '
+            f'({item.count} шт.) '
+            f'на сумму {payment.total_amount / 100:,.2f} ₽!',
+        )
 
 
 @router.callback_query(F.data.startswith('change_count'))
@@ -222,14 +228,13 @@ async def change_product_count(query: CallbackQuery, state: FSMContext):
 
 @router.callback_query(F.data.startswith('delete_from_cart'))
 async def delete_product_from_cart(query: CallbackQuery, state: FSMContext):
-    data = await state.get_data()
-    cart = data.get('cart', {})
-    cart_message_id = data.get('cart_message_id')
-
-    product_id = query.data.split('_')[-1]
-    cart.pop(product_id, None)
+    cart_message_id = await state.get_value('cart_message_id')
+    cart_size = await carts.remove(
+        query.from_user.id,
+        int(query.data.split('_')[-1]),
+    )
 
-    if len(cart) == 0:
+    if cart_size == 0:
         try:
             await query.bot.edit_message_text(
                 'Ваша корзина пуста.\nПерейти в каталог - /catalog',
@@ -244,8 +249,11 @@ async def delete_product_from_cart(query: CallbackQuery, state: FSMContext):
             business_connection_id=query.message.business_connection_id,
             chat_id=query.message.chat.id,
             message_id=cart_message_id,
-            reply_markup=await get_cart_keyboard(cart),
+            reply_markup=await get_cart_keyboard(
+                await carts.get(query.from_user.id),
+            ),
         )
 
-    await state.update_data(cart=cart, product_message_id=None, page=1)
+    await edit_coalescer.forget(query.message.chat.id, cart_message_id)
+    await state.update_data(product_message_id=None)
     await query.message.delete()
@@ -5,10 +5,13 @@ from aiogram.types import (
     CallbackQuery,
     Message,
 )
-from django.db.models import Count
 
 from bot.filters import IsChatMember
-from bot.handlers.utils import send_or_update_product_message
+from bot.handlers.utils import (
+    edit_message,
+    get_page_cursor,
+    send_or_update_product_message,
+)
 from bot.keyboards.inline import yes_no_kb
 from bot.keyboards.utils import (
     get_categories_keyboard,
@@ -16,9 +19,10 @@ from bot.keyboards.utils import (
     get_product_keyboard,
     get_products_keyboard,
 )
+from bot.services import carts, catalog_tree
 from bot.settings import settings
 from bot.states import CatalogState
-from shop.models import Category, Product
+from shop.models import Product
 
 router = Router()
 router.message.filter(IsChatMember())
@@ -27,50 +31,43 @@ router.message.filter(IsChatMember())
 @router.message(Command('catalog'))
 @router.message(F.text == 'Каталог')
 async def display_catalog(msg: Message, state: FSMContext):
-    await state.update_data(product_message_id=None, category_id=None, page=1)
+    await state.update_data(product_message_id=None, category_id=None)
     await msg.answer(
         'Все категории',
         reply_markup=await get_categories_root_keyboard(),
     )
 
 
-@router.callback_query(F.data.in_(('catalog_previous', 'catalog_next')))
+@router.callback_query(F.data.startswith(('catalog_previous', 'catalog_next')))
 async def change_catalog_page(query: CallbackQuery, state: FSMContext):
-    data = await state.get_data()
-    page = data.get('page', 1)
-    category_id = data.get('category_id')
-
-    if query.data == 'catalog_previous':
-        page -= 1
-    else:
-        page += 1
-    await state.update_data(page=page)
+    category_id = await state.get_value('category_id')
+    cursor = get_page_cursor(query.data)
 
     if not category_id:
-        await query.message.edit_text(
+        await edit_message(
+            query.message,
             'Все категории',
-            reply_markup=await get_categories_root_keyboard(page),
+            reply_markup=await get_categories_root_keyboard(**cursor),
         )
         return
 
-    category = (
-        await Category.objects.annotate(
-            subcategories_count=Count('subcategories'),
-        )
-        .select_related('parent_category')
-        .aget(pk=category_id)
-    )
+    category = catalog_tree.get(category_id)
+    if not category:
+        await query.answer('Категория не найдена')
+        return
 
-    if category.subcategories_count == 0:
-        await query.message.edit_text(
+    if category.is_leaf:
+        await edit_message(
+            query.message,
             f'Товары категории {category}',
-            reply_markup=await get_products_keyboard(category, page),
+            reply_markup=await get_products_keyboard(category, **cursor),
         )
         return
 
-    await query.message.edit_text(
+    await edit_message(
+        query.message,
         f'Категория {category}',
-        reply_markup=await get_categories_keyboard(category, page),
+        reply_markup=await get_categories_keyboard(category, **cursor),
     )
 
 
@@ -78,24 +75,22 @@ async def change_catalog_page(query: CallbackQuery, state: FSMContext):
 async def expand_category(query: CallbackQuery, state: FSMContext):
     category_id = int(query.data.split('_')[-1])
     await state.update_data(category_id=category_id)
-    await state.update_data(page=1)
 
-    category = (
-        await Category.objects.annotate(
-            subcategories_count=Count('subcategories'),
-        )
-        .select_related('parent_category')
-        .aget(pk=category_id)
-    )
+    category = catalog_tree.get(category_id)
+    if not category:
+        await query.answer('Категория не найдена')
+        return
 
-    if category.subcategories_count == 0:
-        await query.message.edit_text(
+    if category.is_leaf:
+        await edit_message(
+            query.message,
             f'Товары категории {category}',
             reply_markup=await get_products_keyboard(category),
         )
         return
 
-    await query.message.edit_text(
+    await edit_message(
+        query.message,
         f'Категория {category}',
         reply_markup=await get_categories_keyboard(category),
     )
@@ -104,7 +99,8 @@ async def expand_category(query: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == 'categories_root')
 async def display_categories_root(query: CallbackQuery, state: FSMContext):
     await state.update_data(category_id=None)
-    await query.message.edit_text(
+    await edit_message(
+        query.message,
         'Все категории',
         reply_markup=await get_categories_root_keyboard(),
     )
@@ -174,10 +170,8 @@ async def confirm_product_addition(query: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     product_id = data.get('product_id')
     count = data.get('count')
-    cart = data.get('cart', {})
 
-    cart.update({product_id: count})
-    await state.update_data(cart=cart)
+    await carts.set(query.from_user.id, product_id, count)
 
     product = await Product.objects.aget(pk=product_id)
     await state.set_state(None)
@@ -0,0 +1,15 @@
+from aiogram import Router
+from aiogram.types import ChatMemberUpdated
+
+from bot.services.chat_members import chat_members
+
+router = Router()
+
+
+@router.chat_member()
+async def on_chat_member_updated(event: ChatMemberUpdated):
+    await chat_members.set_status(
+        event.chat.id,
+        event.new_chat_member.user.id,
+        event.new_chat_member.status,
+    )
@@ -1,42 +1,96 @@
-import difflib
-import hashlib
-
 from aiogram import Router
 from aiogram.types import (
     InlineQuery,
     InlineQueryResultArticle,
+    InlineQueryResultCachedPhoto,
     InputTextMessageContent,
 )
 
 from bot.filters import IsChatMember
-from bot.settings.faq import FAQ
+from bot.services import ProductCard, faq_index, search_products
+from bot.settings import settings
 
 router = Router()
 router.message.filter(IsChatMember())
 
 
-@router.inline_query()
-async def inline_faq(query: InlineQuery):
-    questions: list[str] = difflib.get_close_matches(
-        query.query.lower(),
-        FAQ.keys(),
-        cutoff=0.2,
-    )
-
+def get_faq_results(query: str) -> list[InlineQueryResultArticle]:
     results = []
-    for q in questions:
-        answer = FAQ.get(q)
+    for entry in faq_index.search(query):
+        question = entry.question.title()
         results.append(
             InlineQueryResultArticle(
-                id=hashlib.md5(q.encode()).hexdigest(),
-                title=q.title(),
+                id=f'faq_{entry.pk}',
+                title=question,
                 description=(
-                    f'{answer[:50]}...' if len(answer) > 50 else answer
+                    f'{entry.answer[:50]}...'
+                    if len(entry.answer) > 50
+                    else entry.answer
                 ),
                 input_message_content=InputTextMessageContent(
-                    message_text=f'{q.title()}\n\n{answer}',
+                    message_text=f'{question}\n\n{entry.answer}',
                 ),
             ),
         )
+    return results
+
+
+def get_product_result(
+        card: ProductCard,
+        title: str,
+        description: str,
+) -> InlineQueryResultArticle | InlineQueryResultCachedPhoto:
+    if card.image_tg_id:
+        return InlineQueryResultCachedPhoto(
+            id=f'product_{card.pk}',
+            photo_file_id=card.image_tg_id,
+            title=title,
+            description=description,
+            caption=card.caption,
+        )
+    return InlineQueryResultArticle(
+        id=f'product_{card.pk}',
+        title=title,
+        description=description,
+        input_message_content=InputTextMessageContent(
+            message_text=card.caption,
+        ),
+    )
+
+
+@router.inline_query()
+async def inline_search(query: InlineQuery):
+    offset = int(query.offset or 0)
+    text = query.query.strip()
+
+    results = get_faq_results(text) if offset == 0 else []
+    has_next = False
+    if text:
+        products, has_next = await search_products(
+            text,
+            offset=offset,
+            limit=settings.INLINE_PAGE_SIZE,
+        )
+        results.extend(
+            get_product_result(
+                ProductCard.from_product(product),
+                str(product),
+                (
+                    f'{product.description[:50]}...'
+                    if len(product.description) > 50
+                    else product.description
+                ),
+            )
+            for product in products
+        )
 
-    await query.answer(results, cache_time=1)
+    # results don't depend on the user, so Telegram can serve
+    # repeated queries from its cache
+    await query.answer(
+        results,
+        cache_time=settings.INLINE_CACHE_TIME,
+        is_personal=False,
+        next_offset=(
+            str(offset + settings.INLINE_PAGE_SIZE) if has_next else ''
+        ),
+    )
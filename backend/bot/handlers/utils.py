@@ -2,15 +2,13 @@ from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from aiogram.types import (
     CallbackQuery,
-    FSInputFile,
     InlineKeyboardMarkup,
     InputMediaPhoto,
     Message,
 )
-from openpyxl.worksheet.worksheet import Worksheet
 
 from bot.loader import logger
-from shop.models import Product
+from bot.services import edit_coalescer, product_cards
 
 
 async def send_or_update_product_message(
@@ -19,15 +17,13 @@ async def send_or_update_product_message(
         *,
         reply_markup: InlineKeyboardMarkup = None,
 ) -> None:
-    product = await Product.objects.aget(pk=int(query.data.split('_')[-1]))
-    media = product.image_tg_id or FSInputFile(product.image.url.lstrip('/'))
-    caption = f'{product}\n\n{product.description}'
+    card = await product_cards.get(int(query.data.split('_')[-1]))
 
     product_message_id: int = await state.get_value('product_message_id')
     if product_message_id:
         try:
             product_message = await query.bot.edit_message_media(
-                media=InputMediaPhoto(media=media, caption=caption),
+                media=InputMediaPhoto(media=card.media, caption=card.caption),
                 business_connection_id=query.message.business_connection_id,
                 chat_id=query.message.chat.id,
                 message_id=product_message_id,
@@ -38,43 +34,56 @@ async def send_or_update_product_message(
     else:
         product_message = await query.bot.send_photo(
             chat_id=query.message.chat.id,
-            photo=media,
+            photo=card.media,
             business_connection_id=query.message.business_connection_id,
-            caption=caption,
+            caption=card.caption,
             reply_markup=reply_markup,
             reply_to_message_id=query.message.message_id,
         )
     await state.update_data(product_message_id=product_message.message_id)
 
-    if not product.image_tg_id:
-        product.image_tg_id = product_message.photo[0].file_id
-        await product.asave()
+    if not card.image_tg_id:
+        card = await product_cards.set_image_tg_id(
+            card,
+            product_message.photo[-1].file_id,
+        )
         logger.info(
-            f'image_tg_id={product.image_tg_id} '
-            f'was added to product {product.title}',
+            f'image_tg_id={card.image_tg_id} '
+            f'was added to product id={card.pk}',
         )
 
 
-def add_order(
-        sheet: Worksheet,
-        msg: Message,
+def get_page_cursor(callback_data: str) -> dict[str, int]:
+    *_, direction, pk = callback_data.split('_')
+    if not pk.isdigit():
+        # buttons sent before keyset pagination have no cursor,
+        # they open the first page
+        return {}
+    if direction == 'previous':
+        return {'before': int(pk)}
+    return {'after': int(pk)}
+
+
+async def edit_message(
+        message: Message,
+        text: str = None,
         *,
-        product: Product,
-        product_count: int,
-        amount: str,
-        delivery_location: str,
-        order_date: str,
+        reply_markup: InlineKeyboardMarkup = None,
 ) -> None:
-    sheet.append(
-        [
-            msg.successful_payment.provider_payment_charge_id,
-            msg.from_user.id,
-            product.pk,
-            f'@{msg.from_user.username}',
-            delivery_location,
-            product.title,
-            product_count,
-            amount,
-            order_date,
-        ],
-    )
+    """Edits the text (or only the markup if ``text`` is omitted),
+    unless it is the same as in the last edit of the message.
+    """
+    chat_id, message_id = message.chat.id, message.message_id
+    if not await edit_coalescer.is_changed(
+            chat_id,
+            message_id,
+            text,
+            reply_markup,
+    ):
+        return
+
+    if text is None:
+        await message.edit_reply_markup(reply_markup=reply_markup)
+    else:
+        await message.edit_text(text, reply_markup=reply_markup)
+    await edit_coalescer.remember(chat_id, message_id, text, reply_markup)
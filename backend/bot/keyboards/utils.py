@@ -1,9 +1,10 @@
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from django.db.models import Model, QuerySet
+from django.db.models import Model, Q, QuerySet, Subquery
 
+from bot.services import CategoryNode, catalog_tree, keyboard_cache
 from bot.settings import settings
-from shop.models import Category, Product
+from shop.models import Product
 
 
 async def get_pagination_buttons(
@@ -28,9 +29,49 @@ async def get_pagination_buttons(
     return pagination_buttons
 
 
-async def keyboard_from_queryset(
+async def get_page(
     queryset: QuerySet,
     *,
+    after: int = None,
+    before: int = None,
+) -> tuple[list[Model], bool, bool]:
+    # keyset pagination by (title, pk), the cursor row is resolved
+    # in a subquery, so a page costs a single query
+    cursor = queryset.model.objects.filter(pk=after or before).values('title')
+    first_page = queryset.order_by('title', 'pk')
+
+    if before:
+        queryset = (
+            queryset.filter(title__lte=Subquery(cursor))
+            .filter(Q(title__lt=Subquery(cursor)) | Q(pk__lt=before))
+            .order_by('-title', '-pk')
+        )
+    elif after:
+        queryset = (
+            queryset.filter(title__gte=Subquery(cursor))
+            .filter(Q(title__gt=Subquery(cursor)) | Q(pk__gt=after))
+            .order_by('title', 'pk')
+        )
+    else:
+        queryset = first_page
+
+    objects = [obj async for obj in queryset[:settings.PAGE_SIZE + 1]]
+    if not objects and (after or before):
+        # the cursor row was deleted or nothing is left past it
+        return await get_page(first_page)
+
+    has_more = len(objects) > settings.PAGE_SIZE
+    objects = objects[:settings.PAGE_SIZE]
+
+    if before:
+        objects.reverse()
+        return objects, has_more, True
+    return objects, bool(after), has_more
+
+
+async def keyboard_from_objects(
+    objects: list,
+    *,
     prefix: str,
     back_button_data: str = None,
     previous_button_data: str = None,
@@ -41,7 +82,7 @@ async def keyboard_from_queryset(
     if back_button_data:
         kb.button(text='Назад', callback_data=back_button_data)
 
-    async for obj in queryset:
+    for obj in objects:
         kb.button(text=str(obj), callback_data=f'{prefix}_{obj.pk}')
 
     kb.adjust(1)
@@ -56,7 +97,8 @@ async def get_paginated_keyboard(
     model: type[Model],
     *,
     filters: dict = None,
-    page: int = 1,
+    after: int = None,
+    before: int = None,
     prefix: str = '',
     back_button_data: str = None,
     previous_button_data: str = 'catalog_previous',
@@ -65,60 +107,130 @@ async def get_paginated_keyboard(
     if not filters:
         filters = {}
 
-    total_count = await model.objects.filter(**filters).acount()
-    total_pages = (total_count + settings.PAGE_SIZE - 1) // settings.PAGE_SIZE
-    start, end = (page - 1) * settings.PAGE_SIZE, page * settings.PAGE_SIZE
-    queryset = model.objects.filter(**filters)[start:end]
+    cache_key = keyboard_cache.make_key(
+        model._meta.label_lower,
+        '&'.join(f'{k}={v}' for k, v in sorted(filters.items())),
+        after,
+        before,
+        prefix,
+        back_button_data,
+        previous_button_data,
+        next_button_data,
+    )
+    if markup := await keyboard_cache.get(cache_key):
+        return markup
 
-    return await keyboard_from_queryset(
-        queryset,
+    objects, has_previous, has_next = await get_page(
+        model.objects.filter(**filters),
+        after=after,
+        before=before,
+    )
+
+    markup = await keyboard_from_objects(
+        objects,
         prefix=prefix,
         back_button_data=back_button_data,
-        previous_button_data=previous_button_data if page > 1 else None,
-        next_button_data=next_button_data if page < total_pages else None,
+        previous_button_data=(
+            f'{previous_button_data}_{objects[0].pk}'
+            if objects and has_previous
+            else None
+        ),
+        next_button_data=(
+            f'{next_button_data}_{objects[-1].pk}'
+            if objects and has_next
+            else None
+        ),
     )
+    await keyboard_cache.set(cache_key, markup)
+    return markup
 
 
-def get_back_button_data(category: Category) -> str:
+def get_back_button_data(category: CategoryNode) -> str:
     return (
-        f'category_{category.parent_category.pk}'
-        if category.parent_category
+        f'category_{category.parent_id}'
+        if category.parent_id
         else 'categories_root'
     )
 
 
-async def get_categories_root_keyboard(page: int = 1) -> InlineKeyboardMarkup:
-    return await get_paginated_keyboard(
-        Category,
-        filters={'parent_category': None},
-        page=page,
+async def keyboard_from_nodes(
+    nodes: list[CategoryNode],
+    *,
+    after: int = None,
+    before: int = None,
+    back_button_data: str = None,
+) -> InlineKeyboardMarkup:
+    positions = {node.pk: i for i, node in enumerate(nodes)}
+    if before in positions:
+        end = positions[before]
+        start = max(end - settings.PAGE_SIZE, 0)
+    else:
+        start = positions[after] + 1 if after in positions else 0
+        end = start + settings.PAGE_SIZE
+    page = nodes[start:end]
+    if not page:
+        start, end = 0, settings.PAGE_SIZE
+        page = nodes[start:end]
+
+    return await keyboard_from_objects(
+        page,
         prefix='category',
+        back_button_data=back_button_data,
+        previous_button_data=(
+            f'catalog_previous_{page[0].pk}' if page and start > 0 else None
+        ),
+        next_button_data=(
+            f'catalog_next_{page[-1].pk}'
+            if page and end < len(nodes)
+            else None
+        ),
+    )
+
+
+async def get_categories_root_keyboard(
+    after: int = None,
+    before: int = None,
+) -> InlineKeyboardMarkup:
+    return await keyboard_from_nodes(
+        catalog_tree.children(),
+        after=after,
+        before=before,
     )
 
 
 async def get_categories_keyboard(
-    parent_category: Category,
-    page: int = 1,
+    parent_category: CategoryNode,
+    after: int = None,
+    before: int = None,
 ) -> InlineKeyboardMarkup:
-    return await get_paginated_keyboard(
-        Category,
-        filters={'parent_category': parent_category},
-        page=page,
-        prefix='category',
+    return await keyboard_from_nodes(
+        catalog_tree.children(parent_category.pk),
+        after=after,
+        before=before,
         back_button_data=get_back_button_data(parent_category),
     )
 
 
 async def get_products_keyboard(
-    category: Category,
-    page: int = 1,
+    category: CategoryNode,
+    after: int = None,
+    before: int = None,
 ) -> InlineKeyboardMarkup:
+    back_button_data = get_back_button_data(category)
+    if not category.products_count:
+        return await keyboard_from_objects(
+            [],
+            prefix='product',
+            back_button_data=back_button_data,
+        )
+
     return await get_paginated_keyboard(
         Product,
-        filters={'category': category},
-        page=page,
+        filters={'category_id': category.pk},
+        after=after,
+        before=before,
         prefix='product',
-        back_button_data=get_back_button_data(category),
+        back_button_data=back_button_data,
     )
 
 
@@ -161,26 +273,30 @@ async def get_product_detail_keyboard(product_id: int) -> InlineKeyboardMarkup:
 
 
 async def get_cart_keyboard(
-        cart: dict[str, int],
-        page: int = 1,
+        cart: dict[int, int],
+        after: int = None,
+        before: int = None,
 ) -> InlineKeyboardMarkup:
     kb = InlineKeyboardBuilder()
 
-    total_count = len(cart)
-    total_pages = (total_count + settings.PAGE_SIZE - 1) // settings.PAGE_SIZE
-    start, end = (page - 1) * settings.PAGE_SIZE, page * settings.PAGE_SIZE
-    products = Product.objects.filter(pk__in=cart.keys())[start:end]
+    products, has_previous, has_next = await get_page(
+        Product.objects.filter(pk__in=cart.keys()),
+        after=after,
+        before=before,
+    )
 
     kb.button(text='Оплатить всю корзину', callback_data='buy_whole_cart')
-    async for product in products:
+    for product in products:
         kb.button(
-            text=f'{product.title} ({cart.get(str(product.pk), 0)} шт.)',
+            text=f'{product.title} ({cart.get(product.pk, 0)} шт.)',
             callback_data=f'cart_product_{product.pk}',
         )
 
     kb.adjust(1)
     kb.row(*await get_pagination_buttons(
-        'cart_previous' if page > 1 else None,
-        'cart_next' if page < total_pages else None,
+        f'cart_previous_{products[0].pk}'
+        if products and has_previous
+        else None,
+        f'cart_next_{products[-1].pk}' if products and has_next else None,
     ))
     return kb.as_markup()
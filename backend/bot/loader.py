@@ -1,9 +1,10 @@
 import logging
 
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.redis import RedisStorage
 
+from bot.metrics import TelegramMetricsMiddleware
 from bot.settings import settings
+from bot.storage import MsgpackRedisStorage
 
 logging.basicConfig(
     filename='logs/bot.log',
@@ -15,5 +16,13 @@ logger = logging.getLogger('bot')
 logger.setLevel(logging.INFO)
 
 bot = Bot(settings.BOT_TOKEN)
-storage = RedisStorage.from_url(settings.REDIS_URL)
-dp = Dispatcher(storage=storage)
+bot.session.middleware(TelegramMetricsMiddleware())
+# sessions expire after FSM_TTL of inactivity, the TTL is refreshed
+# on every update by BufferedFSMContext
+storage = MsgpackRedisStorage.from_url(
+    settings.REDIS_URL,
+    state_ttl=settings.FSM_TTL,
+    data_ttl=settings.FSM_TTL,
+)
+# FSM middleware is replaced with a buffered one in main.setup
+dp = Dispatcher(storage=storage, disable_fsm=True)
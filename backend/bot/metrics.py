@@ -0,0 +1,209 @@
+import math
+import time
+from bisect import bisect_left
+from collections.abc import Iterator
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiohttp import web
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf,
+)
+
+registry: list['Metric'] = []
+
+
+class Metric:
+    """Base of the metrics exposed in the Prometheus text format."""
+
+    type: str
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: tuple[str, ...] = (),
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        registry.append(self)
+
+    def get_key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def format_labels(self, key: tuple[str, ...], **extra: str) -> str:
+        labels = {**dict(zip(self.labelnames, key, strict=True)), **extra}
+        if not labels:
+            return ''
+        return '{' + ','.join(
+            f'{name}="{self.escape(value)}"' for name, value in labels.items()
+        ) + '}'
+
+    @staticmethod
+    def escape(value: str) -> str:
+        return (
+            value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+        )
+
+    def collect(self) -> Iterator[str]:
+        for key, value in self._values.items():
+            yield f'{self.name}{self.format_labels(key)} {value}'
+
+    def render(self) -> str:
+        return '\n'.join(
+            (
+                f'# HELP {self.name} {self.documentation}',
+                f'# TYPE {self.name} {self.type}',
+                *self.collect(),
+            ),
+        )
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.labelnames:
+            self._values[()] = 0
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self.get_key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(
+            self,
+            *args,
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+            **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self.get_key(labels)
+        if key not in self._values:
+            self._values[key] = [[0] * len(self.buckets), 0]
+        counts, _ = self._values[key]
+        counts[bisect_left(self.buckets, value)] += 1
+        self._values[key][1] += value
+
+    def collect(self) -> Iterator[str]:
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bucket, count in zip(self.buckets, counts, strict=True):
+                cumulative += count
+                le = '+Inf' if bucket == math.inf else str(bucket)
+                labels = self.format_labels(key, le=le)
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            yield f'{self.name}_sum{self.format_labels(key)} {total}'
+            yield f'{self.name}_count{self.format_labels(key)} {cumulative}'
+
+
+def render() -> str:
+    return '\n'.join(metric.render() for metric in registry) + '\n'
+
+
+handler_duration = Histogram(
+    'bot_handler_duration_seconds',
+    'Time spent in a handler.',
+    ('router', 'handler'),
+)
+updates_in_flight = Gauge(
+    'bot_updates_in_flight',
+    'Updates being handled or waiting for a handler slot.',
+)
+update_db_queries = Histogram(
+    'bot_update_db_queries',
+    'ORM queries made while handling an update.',
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, math.inf),
+)
+update_db_duration = Histogram(
+    'bot_update_db_duration_seconds',
+    'Time spent in ORM queries while handling an update.',
+)
+fsm_round_trips = Counter(
+    'bot_fsm_redis_round_trips_total',
+    'Redis round trips made by the buffered FSM context.',
+)
+fsm_unbuffered_round_trips = Counter(
+    'bot_fsm_redis_unbuffered_round_trips_total',
+    'Redis round trips the plain FSM context would have made.',
+)
+telegram_request_duration = Histogram(
+    'bot_telegram_request_duration_seconds',
+    'Telegram Bot API request time.',
+    ('method',),
+)
+telegram_errors = Counter(
+    'bot_telegram_errors_total',
+    'Failed Telegram Bot API requests.',
+    ('method', 'error'),
+)
+telegram_retry_after = Counter(
+    'bot_telegram_retry_after_seconds_total',
+    'Seconds of flood wait requested by Telegram.',
+    ('method',),
+)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Bot session middleware that measures Telegram API requests."""
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: Bot,
+            method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        name = method.__api_method__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            telegram_errors.inc(method=name, error=e.__class__.__name__)
+            if isinstance(e, TelegramRetryAfter):
+                telegram_retry_after.inc(e.retry_after, method=name)
+            raise
+        finally:
+            telegram_request_duration.observe(
+                time.perf_counter() - start,
+                method=name,
+            )
+
+
+async def metrics_view(request: web.Request) -> web.Response:
+    return web.Response(
+        body=render().encode(),
+        headers={'Content-Type': CONTENT_TYPE},
+    )
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_view)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,26 @@
+from bot.middlewares.chat_member import ChatMemberMiddleware, ChatMembership
+from bot.middlewares.client_activity import ClientActivityMiddleware
+from bot.middlewares.coalescing import EditCoalescingMiddleware
+from bot.middlewares.fsm import (
+    BufferedFSMContext,
+    BufferedFSMContextMiddleware,
+)
+from bot.middlewares.metrics import MetricsMiddleware
+from bot.middlewares.scheduler import (
+    Priority,
+    UpdateScheduler,
+    UpdateSchedulerMiddleware,
+)
+
+__all__ = (
+    'BufferedFSMContext',
+    'BufferedFSMContextMiddleware',
+    'ChatMemberMiddleware',
+    'ChatMembership',
+    'ClientActivityMiddleware',
+    'EditCoalescingMiddleware',
+    'MetricsMiddleware',
+    'Priority',
+    'UpdateScheduler',
+    'UpdateSchedulerMiddleware',
+)
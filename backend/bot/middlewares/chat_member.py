@@ -0,0 +1,41 @@
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.types import Message
+
+from bot.services.chat_members import chat_members
+
+
+class ChatMembership:
+    def __init__(self, bot: Bot, user_id: int):
+        self.bot = bot
+        self.user_id = user_id
+        self._is_member: bool | None = None
+
+    async def is_member(self) -> bool:
+        if self._is_member is None:
+            self._is_member = await chat_members.is_member(
+                self.bot,
+                self.user_id,
+            )
+        return self._is_member
+
+
+class ChatMemberMiddleware(BaseMiddleware):
+    """Shares one lazy membership check between all routers that filter
+    an update with ``IsChatMember``.
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[Message, dict[str, Any]], Awaitable[Any]],
+            event: Message,
+            data: dict[str, Any],
+    ) -> Any:
+        if event.from_user:
+            data['chat_membership'] = ChatMembership(
+                data['bot'],
+                event.from_user.id,
+            )
+        return await handler(event, data)
@@ -0,0 +1,28 @@
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import Chat, TelegramObject, User
+
+from bot.services.client_activity import client_activity
+
+
+class ClientActivityMiddleware(BaseMiddleware):
+    """Records users who write to the bot in private chats, the data
+    is saved in batches by ``client_activity``.
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[
+                [TelegramObject, dict[str, Any]],
+                Awaitable[Any],
+            ],
+            event: TelegramObject,
+            data: dict[str, Any],
+    ) -> Any:
+        user: User | None = data.get('event_from_user')
+        chat: Chat | None = data.get('event_chat')
+        if user and not user.is_bot and chat and chat.type == 'private':
+            client_activity.track(user)
+        return await handler(event, data)
@@ -0,0 +1,75 @@
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject, Update
+
+from bot.services.edit_coalescer import edit_coalescer
+
+PAGE_CALLBACK_PREFIXES = (
+    'catalog_previous',
+    'catalog_next',
+    'cart_previous',
+    'cart_next',
+)
+
+
+class EditCoalescingMiddleware(BaseMiddleware):
+    """Answers page flips superseded by a newer flip of the same message
+    without rendering them.
+
+    Must be registered both as an outer ``update`` middleware before
+    the scheduler, where callbacks get their tokens on arrival, and
+    as an outer ``callback_query`` middleware, where callbacks are
+    checked once their turn comes.
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[
+                [TelegramObject, dict[str, Any]],
+                Awaitable[Any],
+            ],
+            event: TelegramObject,
+            data: dict[str, Any],
+    ) -> Any:
+        if isinstance(event, Update):
+            return await self.register(handler, event, data)
+
+        token = data.get('edit_token')
+        if (
+                token
+                and isinstance(event, CallbackQuery)
+                and not await edit_coalescer.is_latest(
+                    event.message.chat.id,
+                    event.message.message_id,
+                    token,
+                )
+        ):
+            await event.answer()
+            return None
+        return await handler(event, data)
+
+    @staticmethod
+    async def register(
+            handler: Callable[
+                [TelegramObject, dict[str, Any]],
+                Awaitable[Any],
+            ],
+            event: Update,
+            data: dict[str, Any],
+    ) -> Any:
+        query = event.callback_query
+        if (
+                not query
+                or not query.message
+                or not query.data
+                or not query.data.startswith(PAGE_CALLBACK_PREFIXES)
+        ):
+            return await handler(event, data)
+
+        data['edit_token'] = await edit_coalescer.register(
+            query.message.chat.id,
+            query.message.message_id,
+        )
+        return await handler(event, data)
@@ -0,0 +1,174 @@
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.middleware import FSMContextMiddleware
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import StateType, StorageKey
+from aiogram.types import TelegramObject
+
+from bot import metrics
+from bot.loader import logger
+from bot.storage import MsgpackRedisStorage
+
+
+class BufferedFSMContext(FSMContext):
+    """FSM context that keeps state and data in memory during an update.
+
+    Changes are written by ``flush`` in a single pipeline. ``load`` also
+    refreshes the TTL of both keys, so only idle sessions expire.
+    ``round_trips`` counts the requests the plain ``FSMContext`` would
+    send to Redis.
+    """
+
+    storage: MsgpackRedisStorage
+
+    def __init__(self, storage: MsgpackRedisStorage, key: StorageKey):
+        super().__init__(storage, key)
+        self.state_key = storage.key_builder.build(key, 'state')
+        self.data_key = storage.key_builder.build(key, 'data')
+        self._state: str | None = None
+        self._data: dict[str, Any] = {}
+        self._state_changed = False
+        self._data_changed = False
+        self.round_trips = 0
+
+    async def load(self) -> None:
+        async with self.storage.redis.pipeline(transaction=False) as pipe:
+            pipe.get(self.state_key)
+            pipe.get(self.data_key)
+            if self.storage.state_ttl:
+                pipe.expire(self.state_key, self.storage.state_ttl)
+            if self.storage.data_ttl:
+                pipe.expire(self.data_key, self.storage.data_ttl)
+            state, data, *_ = await pipe.execute()
+
+        self._state = state.decode() if isinstance(state, bytes) else state
+        self._data = self.storage.decode_data(data)
+
+    async def flush(self) -> int:
+        if not self._state_changed and not self._data_changed:
+            return 0
+
+        async with self.storage.redis.pipeline(transaction=False) as pipe:
+            if self._state_changed:
+                if self._state is None:
+                    pipe.delete(self.state_key)
+                else:
+                    pipe.set(
+                        self.state_key,
+                        self._state,
+                        ex=self.storage.state_ttl,
+                    )
+            if self._data_changed:
+                if not self._data:
+                    pipe.delete(self.data_key)
+                else:
+                    pipe.set(
+                        self.data_key,
+                        self.storage.encode_data(self._data),
+                        ex=self.storage.data_ttl,
+                    )
+            await pipe.execute()
+
+        self._state_changed = self._data_changed = False
+        return 1
+
+    async def set_state(self, state: StateType = None) -> None:
+        self.round_trips += 1
+        self._state = state.state if isinstance(state, State) else state
+        self._state_changed = True
+
+    async def get_state(self) -> str | None:
+        self.round_trips += 1
+        return self._state
+
+    async def set_data(self, data: dict[str, Any]) -> None:
+        self.round_trips += 1
+        self._data = data.copy()
+        self._data_changed = True
+
+    async def get_data(self) -> dict[str, Any]:
+        self.round_trips += 1
+        return self._data.copy()
+
+    async def get_value(self, key: str, default: Any = None) -> Any:
+        self.round_trips += 1
+        return self._data.get(key, default)
+
+    async def update_data(
+            self,
+            data: dict[str, Any] = None,
+            **kwargs: Any,
+    ) -> dict[str, Any]:
+        if data:
+            kwargs.update(data)
+        # RedisStorage.update_data is get_data and set_data
+        self.round_trips += 2
+        self._data.update(kwargs)
+        self._data_changed = True
+        return self._data.copy()
+
+
+class BufferedFSMContextMiddleware(FSMContextMiddleware):
+    """Loads FSM state and data once per update and saves the changes
+    after the handler in one write, instead of a request on every call.
+    """
+
+    log_interval: int = 1000
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.updates = 0
+        self.round_trips = 0
+        self.unbuffered_round_trips = 0
+
+    @classmethod
+    def from_middleware(
+            cls,
+            middleware: FSMContextMiddleware,
+    ) -> 'BufferedFSMContextMiddleware':
+        return cls(
+            storage=middleware.storage,
+            events_isolation=middleware.events_isolation,
+            strategy=middleware.strategy,
+        )
+
+    async def __call__(
+            self,
+            handler: Callable[
+                [TelegramObject, dict[str, Any]],
+                Awaitable[Any],
+            ],
+            event: TelegramObject,
+            data: dict[str, Any],
+    ) -> Any:
+        context = self.resolve_event_context(data['bot'], data)
+        data['fsm_storage'] = self.storage
+        if not context:
+            return await handler(event, data)
+
+        context = BufferedFSMContext(self.storage, context.key)
+        async with self.events_isolation.lock(key=context.key):
+            await context.load()
+            data.update(
+                {'state': context, 'raw_state': await context.get_state()},
+            )
+            try:
+                return await handler(event, data)
+            finally:
+                self.track(1 + await context.flush(), context.round_trips)
+
+    def track(self, round_trips: int, unbuffered_round_trips: int) -> None:
+        self.updates += 1
+        self.round_trips += round_trips
+        self.unbuffered_round_trips += unbuffered_round_trips
+        metrics.fsm_round_trips.inc(round_trips)
+        metrics.fsm_unbuffered_round_trips.inc(unbuffered_round_trips)
+        if self.updates % self.log_interval == 0:
+            logger.info(
+                f'FSM round trips per update: '
+                f'{self.round_trips / self.updates:.2f} '
+                f'(unbuffered: '
+                f'{self.unbuffered_round_trips / self.updates:.2f})',
+            )
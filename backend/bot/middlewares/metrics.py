@@ -0,0 +1,102 @@
+import time
+from collections.abc import Awaitable, Callable
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.types import TelegramObject, Update
+from django.db.backends.signals import connection_created
+
+from bot import metrics
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    duration: float = 0
+
+
+# the stats object is shared with sync_to_async threads,
+# they get a copy of the context with the same object
+query_stats: ContextVar[QueryStats | None] = ContextVar(
+    'query_stats',
+    default=None,
+)
+
+
+def track_query(execute, sql, params, many, context):
+    stats = query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.duration += time.perf_counter() - start
+
+
+def install_query_tracking(sender, connection, **kwargs) -> None:
+    if track_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(track_query)
+
+
+connection_created.connect(install_query_tracking)
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Collects update and handler metrics exposed on ``/metrics``.
+
+    Must be registered as the first outer ``update`` middleware, where
+    it counts updates in flight and ORM queries per update, and as an
+    inner middleware of the other dispatcher observers, where it
+    measures handlers. Inner middlewares of the dispatcher apply to
+    the handlers of all routers.
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[
+                [TelegramObject, dict[str, Any]],
+                Awaitable[Any],
+            ],
+            event: TelegramObject,
+            data: dict[str, Any],
+    ) -> Any:
+        if isinstance(event, Update):
+            return await self.handle_update(handler, event, data)
+
+        handler_object: HandlerObject = data['handler']
+        callback = handler_object.callback
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            metrics.handler_duration.observe(
+                time.perf_counter() - start,
+                router=callback.__module__.rsplit('.', 1)[-1],
+                handler=callback.__name__,
+            )
+
+    @staticmethod
+    async def handle_update(
+            handler: Callable[
+                [TelegramObject, dict[str, Any]],
+                Awaitable[Any],
+            ],
+            event: Update,
+            data: dict[str, Any],
+    ) -> Any:
+        stats = QueryStats()
+        token = query_stats.set(stats)
+        metrics.updates_in_flight.inc()
+        try:
+            return await handler(event, data)
+        finally:
+            metrics.updates_in_flight.dec()
+            query_stats.reset(token)
+            metrics.update_db_queries.observe(stats.count)
+            metrics.update_db_duration.observe(stats.duration)
@@ -0,0 +1,162 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update, User
+
+from bot.loader import logger
+from bot.settings import settings
+
+
+class Priority(IntEnum):
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+class UpdateScheduler:
+    """Limits the number of updates handled at once.
+
+    Slots are given to waiting updates by priority and then in arrival
+    order. Updates of one user are handled one at a time within the
+    process, and a waiting update doesn't take a slot from other users.
+    Across processes only the update queue keeps updates of a user
+    in order.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.depth = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._user_locks: dict[int, tuple[asyncio.Lock, int]] = {}
+
+    async def acquire(self, priority: Priority) -> None:
+        if self.active < self.limit and not self.depth:
+            self.active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        self.depth += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                self.depth -= 1
+            else:
+                # the slot was given right before the cancellation
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            *_, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # the slot goes to the waiter, active count stays the same
+                self.depth -= 1
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def user_lock(self, user_id: int):
+        lock, users = self._user_locks.get(user_id, (asyncio.Lock(), 0))
+        self._user_locks[user_id] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._user_locks[user_id]
+            if users == 1:
+                del self._user_locks[user_id]
+            else:
+                self._user_locks[user_id] = (lock, users - 1)
+
+
+class UpdateSchedulerMiddleware(BaseMiddleware):
+    """Caps the number of updates handled at once and serializes
+    updates of each user.
+
+    Payments go first when the cap is reached, callbacks and inline
+    queries go last. A callback that waited longer than
+    ``SCHEDULER_STALE_TIME`` while the queue is deeper than
+    ``SCHEDULER_SHED_QUEUE_SIZE`` is answered without calling the
+    handler, the user has most likely tapped again by then.
+    """
+
+    log_interval: int = 100
+
+    def __init__(self, scheduler: UpdateScheduler = None):
+        self.scheduler = scheduler or UpdateScheduler(
+            settings.SCHEDULER_CONCURRENCY,
+        )
+        self.shed = 0
+
+    @staticmethod
+    def get_priority(update: Update) -> Priority:
+        if update.pre_checkout_query or (
+                update.message and update.message.successful_payment
+        ):
+            return Priority.HIGH
+        if update.callback_query or update.inline_query:
+            return Priority.LOW
+        return Priority.NORMAL
+
+    async def __call__(
+            self,
+            handler: Callable[
+                [TelegramObject, dict[str, Any]],
+                Awaitable[Any],
+            ],
+            event: Update,
+            data: dict[str, Any],
+    ) -> Any:
+        user: User | None = data.get('event_from_user')
+        if not user:
+            return await self.handle(handler, event, data)
+        async with self.scheduler.user_lock(user.id):
+            return await self.handle(handler, event, data)
+
+    async def handle(
+            self,
+            handler: Callable[
+                [TelegramObject, dict[str, Any]],
+                Awaitable[Any],
+            ],
+            event: Update,
+            data: dict[str, Any],
+    ) -> Any:
+        priority = self.get_priority(event)
+        start = time.monotonic()
+        await self.scheduler.acquire(priority)
+        try:
+            if (
+                    event.callback_query
+                    and self.scheduler.depth
+                    >= settings.SCHEDULER_SHED_QUEUE_SIZE
+                    and time.monotonic() - start
+                    > settings.SCHEDULER_STALE_TIME
+            ):
+                self.track_shed()
+                # stops the loading spinner on the user's side
+                await event.callback_query.answer()
+                return None
+            return await handler(event, data)
+        finally:
+            self.scheduler.release()
+
+    def track_shed(self) -> None:
+        self.shed += 1
+        if self.shed % self.log_interval == 1:
+            logger.warning(
+                f'Stale callbacks dropped: {self.shed}, '
+                f'queue depth: {self.scheduler.depth}',
+            )
@@ -0,0 +1,46 @@
+from bot.services.cart_pricing import (
+    CartPricing,
+    PricedItem,
+    PriceSnapshot,
+    cart_pricing,
+)
+from bot.services.carts import CartService, carts
+from bot.services.catalog_tree import CatalogTree, CategoryNode, catalog_tree
+from bot.services.client_activity import (
+    ClientActivityTracker,
+    client_activity,
+)
+from bot.services.edit_coalescer import EditCoalescer, edit_coalescer
+from bot.services.faq_index import FAQEntry, FAQIndex, faq_index
+from bot.services.keyboard_cache import KeyboardCache, keyboard_cache
+from bot.services.product_cards import (
+    ProductCard,
+    ProductCardCache,
+    product_cards,
+)
+from bot.services.product_search import search_products
+
+__all__ = (
+    'CartPricing',
+    'CartService',
+    'CatalogTree',
+    'CategoryNode',
+    'ClientActivityTracker',
+    'EditCoalescer',
+    'FAQEntry',
+    'FAQIndex',
+    'KeyboardCache',
+    'PriceSnapshot',
+    'PricedItem',
+    'ProductCard',
+    'ProductCardCache',
+    'cart_pricing',
+    'carts',
+    'catalog_tree',
+    'client_activity',
+    'edit_coalescer',
+    'faq_index',
+    'keyboard_cache',
+    'product_cards',
+    'search_products',
+)
@@ -0,0 +1,230 @@
+import asyncio
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import F, QuerySet
+
+from bot.loader import logger
+from bot.settings import settings
+from shop.models import Client, Dispatch, DispatchDelivery
+
+
+class TokenBucket:
+    """Global send rate limit, ``pause`` stops all senders at once."""
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = 0.0
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            while True:
+                now = loop.time()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._updated_at) * self.rate,
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        now = asyncio.get_running_loop().time()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0
+
+
+@dataclass
+class BroadcastResult:
+    sent: int = 0
+    failed: int = 0
+    # messages that weren't sent but can be retried later
+    held: int = 0
+
+
+async def iter_clients(
+        queryset: QuerySet = None,
+        fields: tuple[str, ...] = (),
+        *,
+        batch_size: int = None,
+) -> AsyncIterator[tuple]:
+    # rows are (pk, *fields), batches are taken by the primary key index,
+    # so no sort is needed
+    if queryset is None:
+        queryset = Client.objects.all()
+    queryset = queryset.order_by('pk').values_list('pk', *fields)
+    batch_size = batch_size or settings.DISPATCH_BATCH_SIZE
+
+    last_pk = 0
+    while True:
+        batch = [
+            row async for row in queryset.filter(pk__gt=last_pk)[:batch_size]
+        ]
+        for row in batch:
+            yield row
+        if len(batch) < batch_size:
+            return
+        last_pk = batch[-1][0]
+
+
+class DeliveryLog:
+    """Buffers delivery statuses of a dispatch and saves them in batches."""
+
+    def __init__(self, dispatch_id: int, *, batch_size: int = None):
+        self.dispatch_id = dispatch_id
+        self.batch_size = batch_size or settings.DISPATCH_LOG_BATCH_SIZE
+        self._buffer: list[DispatchDelivery] = []
+
+    async def add(self, client_id: int, sent: bool) -> None:
+        self._buffer.append(
+            DispatchDelivery(
+                dispatch_id=self.dispatch_id,
+                client_id=client_id,
+                status=(
+                    DispatchDelivery.Status.SENT
+                    if sent
+                    else DispatchDelivery.Status.FAILED
+                ),
+            ),
+        )
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        buffer, self._buffer = self._buffer, []
+        if not buffer:
+            return
+        sent = sum(
+            delivery.status == DispatchDelivery.Status.SENT
+            for delivery in buffer
+        )
+
+        # counters of the dispatch are updated with the same batch,
+        # so the admin doesn't count deliveries row by row
+        @sync_to_async
+        def save() -> None:
+            with transaction.atomic():
+                DispatchDelivery.objects.bulk_create(
+                    buffer,
+                    ignore_conflicts=True,
+                )
+                Dispatch.objects.filter(pk=self.dispatch_id).update(
+                    sent_count=F('sent_count') + sent,
+                    failed_count=F('failed_count') + len(buffer) - sent,
+                )
+
+        await save()
+
+
+class Broadcaster:
+    max_attempts: int = 5
+
+    def __init__(
+            self,
+            bot: Bot,
+            *,
+            rate: float = None,
+            max_in_flight: int = None,
+            log: DeliveryLog = None,
+    ):
+        self.bot = bot
+        self.log = log
+        self.bucket = TokenBucket(rate or settings.DISPATCH_RATE)
+        self.semaphore = asyncio.Semaphore(
+            max_in_flight or settings.DISPATCH_MAX_IN_FLIGHT,
+        )
+        self.result = BroadcastResult()
+
+    async def send(self, chat_id: int, text: str) -> bool | None:
+        # None means that the message wasn't sent because of rate limit
+        # or network errors and can be retried later
+        for attempt in range(self.max_attempts):
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id, text)
+                return True
+            except TelegramRetryAfter as e:
+                logger.info(
+                    f'Dispatch is paused for {e.retry_after}s '
+                    f'because of rate limit',
+                )
+                self.bucket.pause(e.retry_after)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logger.warning(
+                    f'Cannot send a message to user (id={chat_id}), '
+                    f'attempt {attempt + 1}: '
+                    f'{e.__class__.__name__}: {str(e)}',
+                )
+                await asyncio.sleep(attempt + 1)
+            except (TelegramBadRequest, TelegramForbiddenError) as e:
+                logger.info(
+                    f'Cannot send a message to user (id={chat_id}) '
+                    f'because of an {e.__class__.__name__} error: {str(e)}',
+                )
+                return False
+        return None
+
+    async def _send(self, chat_id: int, text: str) -> None:
+        # the task is never awaited, so errors must not escape it
+        try:
+            try:
+                sent = await self.send(chat_id, text)
+            except Exception as e:
+                logger.exception(
+                    f'Cannot send a message to user (id={chat_id}): '
+                    f'{e.__class__.__name__}: {str(e)}',
+                )
+                sent = None
+            if sent is None:
+                self.result.held += 1
+            elif sent:
+                self.result.sent += 1
+            else:
+                self.result.failed += 1
+            if self.log and sent is not None:
+                await self.log.add(chat_id, sent)
+        except Exception as e:
+            logger.exception(
+                f'Cannot save the delivery to user (id={chat_id}): '
+                f'{e.__class__.__name__}: {str(e)}',
+            )
+        finally:
+            self.semaphore.release()
+
+    async def run(
+            self,
+            messages: AsyncIterator[tuple[int, str]],
+    ) -> BroadcastResult:
+        tasks = set()
+        async for chat_id, text in messages:
+            await self.semaphore.acquire()
+            task = asyncio.create_task(self._send(chat_id, text))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.wait(tasks)
+        if self.log:
+            await self.log.flush()
+        return self.result
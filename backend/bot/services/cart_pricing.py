@@ -0,0 +1,134 @@
+import json
+from dataclasses import asdict, dataclass
+from uuid import uuid4
+
+from django.db.models import (
+    BigIntegerField,
+    Case,
+    F,
+    Sum,
+    Value,
+    When,
+    Window,
+)
+from django.db.models.functions import Cast
+
+from bot.loader import storage
+from bot.settings import settings
+from shop.models import Product
+
+WHOLE_CART = 'whole_cart'
+
+
+@dataclass(frozen=True, slots=True)
+class PricedItem:
+    product_id: int
+    title: str
+    price: int  # in minor units
+    count: int
+
+    @property
+    def amount(self) -> int:
+        return self.price * self.count
+
+
+@dataclass(frozen=True, slots=True)
+class PriceSnapshot:
+    items: tuple[PricedItem, ...] = ()
+    amount: int = 0
+    delivery_address: str = ''
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, value: str | bytes) -> 'PriceSnapshot':
+        data = json.loads(value)
+        return cls(
+            items=tuple(PricedItem(**item) for item in data['items']),
+            amount=data['amount'],
+            delivery_address=data.get('delivery_address', ''),
+        )
+
+
+class CartPricing:
+    """Prices carts in minor units and freezes the result for an invoice.
+
+    The snapshot is stored in Redis under the invoice payload, so
+    the payment is checked and saved with the prices the user has seen.
+    """
+
+    key = 'invoice:{}'
+
+    @staticmethod
+    def get_scope(payload: str) -> str:
+        # payloads are <scope>:<token>, scope is whole_cart or product_<pk>
+        return payload.split(':')[0]
+
+    async def price(self, cart: dict[int, int]) -> PriceSnapshot:
+        if not cart:
+            return PriceSnapshot()
+
+        price = Cast(F('price') * 100, BigIntegerField())
+        count = Case(
+            *[
+                When(pk=product_id, then=Value(count))
+                for product_id, count in cart.items()
+            ],
+            output_field=BigIntegerField(),
+        )
+        rows = [
+            row
+            async for row in Product.objects.filter(pk__in=cart.keys())
+            .annotate(
+                minor_price=price,
+                total=Window(Sum(price * count)),
+            )
+            .order_by('pk')
+            .values_list('pk', 'title', 'minor_price', 'total')
+        ]
+        if not rows:
+            return PriceSnapshot()
+
+        return PriceSnapshot(
+            items=tuple(
+                PricedItem(
+                    product_id=pk,
+                    title=title,
+                    price=price,
+                    count=cart[pk],
+                )
+                for pk, title, price, _ in rows
+            ),
+            amount=rows[0][-1],
+        )
+
+    async def price_scope(
+            self,
+            cart: dict[int, int],
+            scope: str,
+    ) -> PriceSnapshot:
+        if scope != WHOLE_CART:
+            product_id = int(scope.split('_')[-1])
+            cart = {product_id: cart[product_id]} if product_id in cart else {}
+        return await self.price(cart)
+
+    async def freeze(self, snapshot: PriceSnapshot, scope: str) -> str:
+        payload = f'{scope}:{uuid4().hex}'
+        await storage.redis.set(
+            self.key.format(payload),
+            snapshot.to_json(),
+            ex=settings.INVOICE_SNAPSHOT_TTL,
+        )
+        return payload
+
+    async def get(self, payload: str) -> PriceSnapshot | None:
+        value = await storage.redis.get(self.key.format(payload))
+        return PriceSnapshot.from_json(value) if value else None
+
+    async def pop(self, payload: str) -> PriceSnapshot | None:
+        value = await storage.redis.getdel(self.key.format(payload))
+        return PriceSnapshot.from_json(value) if value else None
+
+
+cart_pricing = CartPricing()
@@ -0,0 +1,45 @@
+from bot.loader import storage
+from bot.settings import settings
+
+
+class CartService:
+    """User carts stored as Redis hashes ``{product_id: count}``.
+
+    Every change is a single hash command, so concurrent updates
+    of the same cart don't overwrite each other. Carts outlive FSM
+    sessions, they expire after ``CART_TTL`` without changes.
+    """
+
+    key = 'cart:{}'
+
+    async def get(self, user_id: int) -> dict[int, int]:
+        cart = await storage.redis.hgetall(self.key.format(user_id))
+        return {
+            int(product_id): int(count) for product_id, count in cart.items()
+        }
+
+    async def set(self, user_id: int, product_id: int, count: int) -> None:
+        async with storage.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.key.format(user_id), product_id, count)
+            pipe.expire(self.key.format(user_id), settings.CART_TTL)
+            await pipe.execute()
+
+    async def remove(self, user_id: int, product_id: int) -> int:
+        # returns the number of products left in the cart
+        async with storage.redis.pipeline(transaction=True) as pipe:
+            pipe.hdel(self.key.format(user_id), product_id)
+            pipe.hlen(self.key.format(user_id))
+            pipe.expire(self.key.format(user_id), settings.CART_TTL)
+            _, size, _ = await pipe.execute()
+        return size
+
+    async def update(self, user_id: int, cart: dict[int, int]) -> None:
+        if not cart:
+            return
+        async with storage.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.key.format(user_id), mapping=cart)
+            pipe.expire(self.key.format(user_id), settings.CART_TTL)
+            await pipe.execute()
+
+
+carts = CartService()
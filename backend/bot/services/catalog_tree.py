@@ -0,0 +1,115 @@
+import asyncio
+from collections import defaultdict
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+from django.db.models import Count
+
+from bot.loader import logger, storage
+from bot.services.pubsub import PubSubReloader
+from shop.cache import CATALOG_CHANNEL, CATALOG_VERSION_KEY
+from shop.models import Category, Product
+
+
+@dataclass(frozen=True, slots=True)
+class CategoryNode:
+    pk: int
+    title: str
+    parent_id: int | None
+    children: tuple[int, ...]
+    products_count: int
+
+    @property
+    def is_leaf(self) -> bool:
+        return not self.children
+
+    def __str__(self):
+        return self.title
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogTree:
+    nodes: MappingProxyType = field(
+        default_factory=lambda: MappingProxyType({}),
+    )
+    roots: tuple[int, ...] = ()
+
+    def get(self, pk: int) -> CategoryNode | None:
+        return self.nodes.get(pk)
+
+    def children(self, pk: int | None = None) -> list[CategoryNode]:
+        children = self.roots if pk is None else self.nodes[pk].children
+        return [self.nodes[child_pk] for child_pk in children]
+
+    @classmethod
+    async def load(cls) -> 'CatalogTree':
+        products_count = {
+            category_id: count
+            async for category_id, count in Product.objects.order_by()
+            .values_list('category_id')
+            .annotate(count=Count('pk'))
+        }
+
+        rows = [
+            row
+            async for row in Category.objects.order_by(
+                'parent_category_id',
+                'title',
+                'pk',
+            ).values_list('pk', 'title', 'parent_category_id')
+        ]
+        children = defaultdict(list)
+        for pk, _, parent_id in rows:
+            children[parent_id].append(pk)
+
+        nodes = {
+            pk: CategoryNode(
+                pk=pk,
+                title=title,
+                parent_id=parent_id,
+                children=tuple(children.get(pk, ())),
+                products_count=products_count.get(pk, 0),
+            )
+            for pk, title, parent_id in rows
+        }
+        return cls(
+            nodes=MappingProxyType(nodes),
+            roots=tuple(children.get(None, ())),
+        )
+
+
+class CatalogTreeCache(PubSubReloader):
+    """Holds an immutable ``CatalogTree`` and swaps it on every change
+    published by ``shop.signals`` to ``CATALOG_CHANNEL``.
+
+    ``version`` mirrors the ``CATALOG_VERSION_KEY`` counter and is used
+    to namespace shared caches of catalog data.
+    """
+
+    channel = CATALOG_CHANNEL
+
+    def __init__(self):
+        super().__init__()
+        self.tree = CatalogTree()
+        self.version = 0
+        self._lock = asyncio.Lock()
+
+    def get(self, pk: int) -> CategoryNode | None:
+        return self.tree.get(pk)
+
+    def children(self, pk: int | None = None) -> list[CategoryNode]:
+        return self.tree.children(pk)
+
+    async def rebuild(self) -> None:
+        async with self._lock:
+            # the version is read first, so it never runs ahead of the tree
+            version = int(await storage.redis.get(CATALOG_VERSION_KEY) or 0)
+            self.tree = await CatalogTree.load()
+            self.version = version
+        logger.info(
+            f'Catalog tree was rebuilt: {len(self.tree.nodes)} nodes, '
+            f'version={self.version}',
+        )
+
+
+catalog_tree = CatalogTreeCache()
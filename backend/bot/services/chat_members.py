@@ -0,0 +1,66 @@
+import asyncio
+
+from aiogram import Bot
+from aiogram.enums import ChatMemberStatus
+
+from bot.loader import storage
+from bot.settings import settings
+
+NOT_MEMBER_STATUSES = (ChatMemberStatus.LEFT, ChatMemberStatus.KICKED)
+
+
+class ChatMembersCache:
+    """Membership of users in ``SUBSCRIBE_CHATS`` cached in Redis.
+
+    Entries are refreshed by ``chat_member`` updates, the TTL only covers
+    chats where the bot doesn't receive them.
+    """
+
+    key = 'chat_member:{}:{}'
+
+    async def is_member(self, bot: Bot, user_id: int) -> bool:
+        chats = settings.SUBSCRIBE_CHATS
+        values = await storage.redis.mget(
+            [self.key.format(chat_id, user_id) for chat_id in chats],
+        )
+        if b'0' in values:
+            return False
+
+        missing = [
+            chat_id
+            for chat_id, value in zip(chats, values, strict=True)
+            if value is None
+        ]
+        if not missing:
+            return True
+
+        members = await asyncio.gather(
+            *(bot.get_chat_member(chat_id, user_id) for chat_id in missing),
+        )
+        async with storage.redis.pipeline(transaction=False) as pipe:
+            for chat_id, member in zip(missing, members, strict=True):
+                self._set_status(pipe, chat_id, user_id, member.status)
+            await pipe.execute()
+
+        return all(
+            member.status not in NOT_MEMBER_STATUSES for member in members
+        )
+
+    async def set_status(
+            self,
+            chat_id: int | str,
+            user_id: int,
+            status: ChatMemberStatus,
+    ) -> None:
+        if str(chat_id) in settings.SUBSCRIBE_CHATS:
+            await self._set_status(storage.redis, chat_id, user_id, status)
+
+    def _set_status(self, redis, chat_id, user_id, status):
+        if status in NOT_MEMBER_STATUSES:
+            value, ttl = 0, settings.CHAT_MEMBER_NEGATIVE_CACHE_TTL
+        else:
+            value, ttl = 1, settings.CHAT_MEMBER_CACHE_TTL
+        return redis.set(self.key.format(chat_id, user_id), value, ex=ttl)
+
+
+chat_members = ChatMembersCache()
@@ -0,0 +1,80 @@
+import asyncio
+
+from aiogram.types import User
+from django.utils import timezone
+
+from bot.loader import logger
+from bot.settings import settings
+from shop.models import Client
+
+
+class ClientActivityTracker:
+    """Collects profiles and activity time of users in memory and saves
+    them with one upsert every ``flush_interval`` seconds.
+    """
+
+    update_fields = (
+        'first_name',
+        'last_name',
+        'username',
+        'is_premium',
+        'last_seen_at',
+    )
+
+    def __init__(self, flush_interval: float = None):
+        self.flush_interval = (
+            flush_interval or settings.CLIENT_ACTIVITY_FLUSH_INTERVAL
+        )
+        self._dirty: dict[int, Client] = {}
+        self._task: asyncio.Task | None = None
+
+    def track(self, user: User) -> None:
+        self._dirty[user.id] = Client(
+            id=user.id,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            username=user.username or '',
+            is_premium=user.is_premium or False,
+            last_seen_at=timezone.now(),
+        )
+
+    async def flush(self) -> None:
+        dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return
+
+        try:
+            await Client.objects.abulk_create(
+                dirty.values(),
+                update_conflicts=True,
+                unique_fields=['id'],
+                update_fields=self.update_fields,
+            )
+        except Exception:
+            # newer activity of the same users wins over the failed batch
+            for pk, client in dirty.items():
+                self._dirty.setdefault(pk, client)
+            raise
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.exception(
+                    f'Cannot save client activity: '
+                    f'{e.__class__.__name__}: {str(e)}',
+                )
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+
+client_activity = ClientActivityTracker()
@@ -0,0 +1,51 @@
+from collections.abc import AsyncIterator
+from string import Template
+
+from django.db.models import QuerySet
+
+from bot.services.broadcaster import iter_clients
+
+
+class DispatchTemplate:
+    """``Dispatch.text`` compiled once per dispatch.
+
+    Only the client fields used as placeholders are fetched and rendered,
+    a text without placeholders is rendered once.
+    """
+
+    fields = ('id', 'first_name', 'last_name', 'username', 'is_premium')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.template = Template(text)
+        self.used_fields = tuple(
+            field
+            for field in self.template.get_identifiers()
+            if field in self.fields
+        )
+        # renders escapes like $$ the same way as for the other texts
+        self.static_text = self.template.safe_substitute({})
+
+    @property
+    def is_static(self) -> bool:
+        return not self.used_fields
+
+    def render(self, values: tuple) -> str:
+        return self.template.safe_substitute(
+            {
+                field: '' if value is None else value
+                for field, value in zip(self.used_fields, values, strict=True)
+            },
+        )
+
+    async def iter_messages(
+            self,
+            clients: QuerySet,
+    ) -> AsyncIterator[tuple[int, str]]:
+        if self.is_static:
+            async for row in iter_clients(clients):
+                yield row[0], self.static_text
+            return
+
+        async for pk, *values in iter_clients(clients, self.used_fields):
+            yield pk, self.render(values)
@@ -0,0 +1,83 @@
+import hashlib
+
+from aiogram.types import InlineKeyboardMarkup
+
+from bot.loader import storage
+from bot.settings import settings
+
+
+class EditCoalescer:
+    """Tracks page flips and edits of bot messages.
+
+    Every navigation callback gets a token on arrival. Only the callback
+    with the latest token of a message is worth handling, the others
+    would render a page that is replaced right away. Tokens and hashes
+    of the last sent text and markup are kept in Redis, so callbacks
+    handled by different processes are compared with each other and
+    edits that change nothing are skipped by any process.
+    """
+
+    key = 'edit_hash:{}:{}'
+    token_key = 'edit_token:{}:{}'
+
+    async def register(self, chat_id: int, message_id: int) -> int:
+        key = self.token_key.format(chat_id, message_id)
+        async with storage.redis.pipeline(transaction=True) as pipe:
+            pipe.incr(key)
+            pipe.expire(key, settings.EDIT_TOKEN_TTL)
+            token, _ = await pipe.execute()
+        return token
+
+    async def is_latest(
+            self,
+            chat_id: int,
+            message_id: int,
+            token: int,
+    ) -> bool:
+        latest = await storage.redis.get(
+            self.token_key.format(chat_id, message_id),
+        )
+        # an expired counter means no flips for a while
+        return latest is None or int(latest) == token
+
+    @staticmethod
+    def get_hash(
+            text: str | None,
+            reply_markup: InlineKeyboardMarkup | None,
+    ) -> str:
+        content = [text, reply_markup and reply_markup.model_dump_json()]
+        return hashlib.blake2b(
+            repr(content).encode(),
+            digest_size=16,
+        ).hexdigest()
+
+    async def is_changed(
+            self,
+            chat_id: int,
+            message_id: int,
+            text: str | None,
+            reply_markup: InlineKeyboardMarkup | None,
+    ) -> bool:
+        last_hash = await storage.redis.get(
+            self.key.format(chat_id, message_id),
+        )
+        return last_hash != self.get_hash(text, reply_markup).encode()
+
+    async def remember(
+            self,
+            chat_id: int,
+            message_id: int,
+            text: str | None,
+            reply_markup: InlineKeyboardMarkup | None,
+    ) -> None:
+        await storage.redis.set(
+            self.key.format(chat_id, message_id),
+            self.get_hash(text, reply_markup),
+            ex=settings.EDIT_HASH_TTL,
+        )
+
+    async def forget(self, chat_id: int, message_id: int) -> None:
+        await storage.redis.delete(self.key.format(chat_id, message_id))
+
+
+edit_coalescer = EditCoalescer()
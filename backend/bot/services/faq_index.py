@@ -0,0 +1,101 @@
+import heapq
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+
+from bot.loader import logger
+from bot.services.pubsub import PubSubReloader
+from shop.cache import FAQ_CHANNEL
+from shop.models import FAQ
+
+
+def get_trigrams(text: str) -> frozenset[str]:
+    text = f'  {" ".join(text.lower().split())} '
+    return frozenset(text[i:i + 3] for i in range(len(text) - 2))
+
+
+@dataclass(frozen=True, slots=True)
+class FAQEntry:
+    pk: int
+    question: str
+    answer: str
+
+
+class FAQIndex:
+    """Inverted index from question trigrams to entries.
+
+    A query only touches entries that share a trigram with it, they are
+    ranked by the Dice coefficient of trigram sets. Results of recent
+    queries are kept in an LRU cache that lives as long as the index.
+    """
+
+    def __init__(self, entries: list[FAQEntry], cache_size: int = 1024):
+        self.entries = tuple(entries)
+        self._sizes = []
+        postings = defaultdict(list)
+        for i, entry in enumerate(self.entries):
+            trigrams = get_trigrams(entry.question)
+            self._sizes.append(len(trigrams))
+            for trigram in trigrams:
+                postings[trigram].append(i)
+        self._postings = {k: tuple(v) for k, v in postings.items()}
+        self.search = lru_cache(maxsize=cache_size)(self._search)
+
+    def _search(
+            self,
+            query: str,
+            limit: int = 3,
+            cutoff: float = 0.2,
+    ) -> tuple[FAQEntry, ...]:
+        trigrams = get_trigrams(query)
+        shared = defaultdict(int)
+        for trigram in trigrams:
+            for i in self._postings.get(trigram, ()):
+                shared[i] += 1
+
+        scores = (
+            (2 * count / (len(trigrams) + self._sizes[i]), i)
+            for i, count in shared.items()
+        )
+        return tuple(
+            self.entries[i]
+            for score, i in heapq.nlargest(limit, scores)
+            if score >= cutoff
+        )
+
+    @classmethod
+    async def load(cls) -> 'FAQIndex':
+        return cls(
+            [
+                FAQEntry(*row)
+                async for row in FAQ.objects.values_list(
+                    'pk',
+                    'question',
+                    'answer',
+                )
+            ],
+        )
+
+
+class FAQIndexCache(PubSubReloader):
+    """Holds the ``FAQIndex`` and rebuilds it on every change of FAQ
+    published by ``shop.signals`` to ``FAQ_CHANNEL``.
+    """
+
+    channel = FAQ_CHANNEL
+
+    def __init__(self):
+        super().__init__()
+        self.index = FAQIndex([])
+
+    def search(self, query: str) -> tuple[FAQEntry, ...]:
+        return self.index.search(query)
+
+    async def rebuild(self) -> None:
+        self.index = await FAQIndex.load()
+        logger.info(
+            f'FAQ index was rebuilt: {len(self.index.entries)} entries',
+        )
+
+
+faq_index = FAQIndexCache()
@@ -0,0 +1,85 @@
+import asyncio
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import FSInputFile
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+
+from bot.loader import bot, logger
+from bot.settings import settings
+from shop.cache import invalidate_product_cards
+from shop.models import Product
+
+
+async def upload_product_image(
+        product: Product,
+        semaphore: asyncio.Semaphore,
+) -> str | None:
+    async with semaphore:
+        while True:
+            try:
+                message = await bot.send_photo(
+                    settings.STORAGE_CHAT_ID,
+                    FSInputFile(product.image.url.lstrip('/')),
+                    disable_notification=True,
+                )
+                return message.photo[-1].file_id
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except (TelegramBadRequest, FileNotFoundError) as e:
+                logger.warning(
+                    f'Cannot upload an image of product (id={product.pk}) '
+                    f'because of an {e.__class__.__name__} error: {str(e)}',
+                )
+                return None
+
+
+async def upload_product_images(
+        *,
+        workers: int = None,
+        batch_size: int = None,
+) -> int:
+    """Uploads images of products without ``image_tg_id`` to the storage
+    chat and saves the returned file ids. Every batch is saved before
+    the next one is uploaded, so an interrupted run can be restarted.
+    """
+    if not settings.STORAGE_CHAT_ID:
+        logger.warning('STORAGE_CHAT_ID is not set, uploading is skipped')
+        return 0
+
+    semaphore = asyncio.Semaphore(workers or settings.IMAGE_UPLOAD_WORKERS)
+    batch_size = batch_size or settings.IMAGE_UPLOAD_BATCH_SIZE
+    queryset = (
+        Product.objects.filter(
+            Q(image_tg_id__isnull=True) | Q(image_tg_id=''),
+        )
+        .exclude(image='')
+        .only('image')
+        .order_by('pk')
+    )
+
+    uploaded, last_pk = 0, 0
+    while True:
+        products = [
+            product
+            async for product in queryset.filter(pk__gt=last_pk)[:batch_size]
+        ]
+        if not products:
+            break
+        last_pk = products[-1].pk
+
+        file_ids = await asyncio.gather(
+            *(upload_product_image(p, semaphore) for p in products),
+        )
+        for product, file_id in zip(products, file_ids, strict=True):
+            product.image_tg_id = file_id
+
+        products = [product for product in products if product.image_tg_id]
+        await Product.objects.abulk_update(products, ['image_tg_id'])
+        await sync_to_async(invalidate_product_cards)(
+            *(product.pk for product in products),
+        )
+        uploaded += len(products)
+        logger.info(f'Uploaded images of {uploaded} products')
+
+    return uploaded
@@ -0,0 +1,51 @@
+from aiogram.types import InlineKeyboardMarkup
+
+from bot.loader import logger, storage
+from bot.services.catalog_tree import catalog_tree
+from bot.settings import settings
+
+
+class KeyboardCache:
+    """Rendered catalog keyboards shared by all bot processes.
+
+    Keys are namespaced by the catalog version, so a catalog change makes
+    all previous entries unreachable and they expire by TTL.
+    """
+
+    log_interval: int = 1000
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return ':'.join(
+            ['keyboard', str(catalog_tree.version), *map(str, parts)],
+        )
+
+    async def get(self, key: str) -> InlineKeyboardMarkup | None:
+        value = await storage.redis.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        if (self.hits + self.misses) % self.log_interval == 0:
+            logger.info(
+                f'Keyboard cache: hits={self.hits} misses={self.misses}',
+            )
+
+        if value is None:
+            return None
+        return InlineKeyboardMarkup.model_validate_json(value)
+
+    async def set(self, key: str, markup: InlineKeyboardMarkup) -> None:
+        await storage.redis.set(
+            key,
+            markup.model_dump_json(exclude_none=True),
+            ex=settings.KEYBOARD_CACHE_TTL,
+        )
+
+
+keyboard_cache = KeyboardCache()
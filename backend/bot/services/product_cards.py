@@ -0,0 +1,77 @@
+import json
+from dataclasses import asdict, dataclass, replace
+
+from aiogram.types import FSInputFile
+
+from bot.loader import storage
+from bot.settings import settings
+from shop.cache import PRODUCT_CARD_KEY
+from shop.models import Product
+
+
+@dataclass(frozen=True, slots=True)
+class ProductCard:
+    pk: int
+    caption: str
+    image_path: str
+    image_tg_id: str | None = None
+
+    @property
+    def media(self) -> str | FSInputFile:
+        return self.image_tg_id or FSInputFile(self.image_path)
+
+    @classmethod
+    def from_product(cls, product: Product) -> 'ProductCard':
+        return cls(
+            pk=product.pk,
+            caption=f'{product}\n\n{product.description}',
+            image_path=product.image.url.lstrip('/'),
+            image_tg_id=product.image_tg_id,
+        )
+
+
+class ProductCardCache:
+    """Rendered product cards shared by all bot processes.
+
+    ``shop.signals`` drops a card when its product is saved or deleted.
+    """
+
+    async def get(self, pk: int) -> ProductCard:
+        value = await storage.redis.get(PRODUCT_CARD_KEY.format(pk))
+        if value is not None:
+            return ProductCard(**json.loads(value))
+
+        product = await Product.objects.only(
+            'title',
+            'description',
+            'price',
+            'image',
+            'image_tg_id',
+        ).aget(pk=pk)
+        card = ProductCard.from_product(product)
+        await self.set(card)
+        return card
+
+    async def set(self, card: ProductCard) -> None:
+        await storage.redis.set(
+            PRODUCT_CARD_KEY.format(card.pk),
+            json.dumps(asdict(card)),
+            ex=settings.PRODUCT_CARD_TTL,
+        )
+
+    async def set_image_tg_id(
+            self,
+            card: ProductCard,
+            image_tg_id: str,
+    ) -> ProductCard:
+        # a targeted UPDATE, it doesn't fire post_save, so the card
+        # is refreshed here instead of being dropped by shop.signals
+        await Product.objects.filter(pk=card.pk).aupdate(
+            image_tg_id=image_tg_id,
+        )
+        card = replace(card, image_tg_id=image_tg_id)
+        await self.set(card)
+        return card
+
+
+product_cards = ProductCardCache()
@@ -0,0 +1,36 @@
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramSimilarity,
+)
+from django.db.models import F, Q
+
+from shop.models import Product
+
+
+async def search_products(
+        query: str,
+        *,
+        offset: int = 0,
+        limit: int = 20,
+) -> tuple[list[Product], bool]:
+    # full-text matches go first, trigram similarity of the title
+    # catches typos, both conditions are served by GIN indexes
+    search_query = SearchQuery(
+        query,
+        search_type='websearch',
+        config='russian',
+    )
+    products = [
+        product
+        async for product in Product.objects.filter(
+            Q(search_vector=search_query) | Q(title__trigram_similar=query),
+        )
+        .annotate(
+            rank=SearchRank(F('search_vector'), search_query),
+            similarity=TrigramSimilarity('title', query),
+        )
+        .only('title', 'description', 'price', 'image', 'image_tg_id')
+        .order_by('-rank', '-similarity', 'pk')[offset:offset + limit + 1]
+    ]
+    return products[:limit], len(products) > limit
@@ -0,0 +1,54 @@
+import asyncio
+
+from bot.loader import logger, storage
+
+
+class PubSubReloader:
+    """Base class for in-memory caches rebuilt on messages published
+    to a Redis channel by ``shop.signals``.
+
+    Bursts of messages are debounced into a single rebuild and the cache
+    is rebuilt after a reconnect, since messages could be missed.
+    """
+
+    channel: str
+    debounce_delay: float = 0.5
+    reconnect_delay: float = 5
+
+    def __init__(self):
+        self._listener: asyncio.Task | None = None
+
+    async def rebuild(self) -> None:
+        raise NotImplementedError
+
+    async def listen(self) -> None:
+        reconnected = False
+        while True:
+            try:
+                async with storage.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    if reconnected:
+                        await self.rebuild()
+                    async for message in pubsub.listen():
+                        if message['type'] != 'message':
+                            continue
+                        await asyncio.sleep(self.debounce_delay)
+                        while await pubsub.get_message(timeout=0):
+                            pass
+                        await self.rebuild()
+            except Exception as e:
+                logger.exception(
+                    f'{self.__class__.__name__} listener failed: '
+                    f'{e.__class__.__name__}: {str(e)}',
+                )
+                reconnected = True
+                await asyncio.sleep(self.reconnect_delay)
+
+    async def start(self) -> None:
+        await self.rebuild()
+        self._listener = asyncio.create_task(self.listen())
+
+    async def stop(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
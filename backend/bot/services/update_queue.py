@@ -0,0 +1,309 @@
+import asyncio
+import math
+import time
+from collections import defaultdict
+from contextlib import suppress
+
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import Update
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+from redis.asyncio.lock import Lock
+from redis.exceptions import LockError, RedisError, ResponseError
+
+from bot.loader import logger, storage
+from bot.settings import settings
+
+
+class UpdateQueue:
+    """Telegram updates stored in Redis Streams, partitioned by user id.
+
+    Updates of a user always go to the same partition and a partition
+    is read by a single worker, so they are handled in order.
+    """
+
+    stream = 'updates:{}'
+    group = 'bot'
+
+    def __init__(self, partitions: int = None):
+        self.partitions = partitions or settings.UPDATE_QUEUE_PARTITIONS
+
+    def get_stream(self, partition: int) -> str:
+        return self.stream.format(partition)
+
+    @staticmethod
+    def get_user_id(update: Update) -> int:
+        context = UserContextMiddleware.resolve_event_context(update)
+        return context.user_id or context.chat_id or 0
+
+    async def push(self, update: Update) -> None:
+        partition = self.get_user_id(update) % self.partitions
+        await storage.redis.xadd(
+            self.get_stream(partition),
+            {'update': update.model_dump_json(exclude_unset=True)},
+            maxlen=settings.UPDATE_QUEUE_MAXLEN,
+            approximate=True,
+        )
+
+
+class UpdateQueueWorker:
+    """Feeds updates of the partitions it holds leases on to the dispatcher.
+
+    A lease is a Redis lock that expires unless it is renewed within
+    ``UPDATE_QUEUE_LEASE_TTL``. Workers renew their leases, take free
+    partitions up to an even share and give away the rest on a timer,
+    so partitions of a dead worker move to the live ones and a new
+    worker gets its share. Entries are acknowledged after they are
+    handled, entries left unacknowledged by a dead worker are claimed
+    once they have been idle for ``UPDATE_QUEUE_CLAIM_IDLE_TIME``.
+    """
+
+    workers_key = 'update_workers'
+    lease_key = 'lease:updates:{}'
+
+    def __init__(
+            self,
+            queue: UpdateQueue,
+            dispatcher: Dispatcher,
+            bot: Bot,
+            *,
+            index: int = 0,
+    ):
+        self.queue = queue
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.index = index
+        self.consumer = f'worker-{index}'
+        self.leases: dict[int, Lock] = {}
+        self.tasks: dict[int, asyncio.Task] = {}
+        self.stopping: set[int] = set()
+
+    async def run(self) -> None:
+        try:
+            while True:
+                try:
+                    await self.balance()
+                except Exception as e:
+                    logger.exception(
+                        f'Cannot balance update partitions: '
+                        f'{e.__class__.__name__}: {str(e)}',
+                    )
+                await asyncio.sleep(settings.UPDATE_QUEUE_LEASE_TTL / 3)
+        finally:
+            for task in self.tasks.values():
+                task.cancel()
+            await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+            await storage.redis.zrem(self.workers_key, self.consumer)
+
+    async def get_share(self) -> int:
+        # workers announce themselves on every balance,
+        # the ones silent for a lease TTL are considered dead
+        now = time.time()
+        async with storage.redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(self.workers_key, {self.consumer: now})
+            pipe.zremrangebyscore(
+                self.workers_key,
+                0,
+                now - settings.UPDATE_QUEUE_LEASE_TTL,
+            )
+            pipe.zcard(self.workers_key)
+            *_, workers = await pipe.execute()
+        return math.ceil(self.queue.partitions / workers)
+
+    async def balance(self) -> None:
+        for partition, lease in list(self.leases.items()):
+            try:
+                await lease.reacquire()
+            except (LockError, RedisError) as e:
+                # another worker may own the partition by now
+                logger.warning(
+                    f'Lease of partition {partition} was lost by '
+                    f'{self.consumer}: {e.__class__.__name__}: {str(e)}',
+                )
+                self.tasks[partition].cancel()
+
+        share = await self.get_share()
+        held = [p for p in self.leases if p not in self.stopping]
+        for partition in held[share:]:
+            # stops after the current batch, so nothing is handled twice
+            self.stopping.add(partition)
+
+        # workers start looking from different partitions
+        # to compete less for the same leases
+        partitions = sorted(
+            range(self.queue.partitions),
+            key=lambda p: (p - self.index) % self.queue.partitions,
+        )
+        for partition in partitions:
+            if len(self.leases) >= share:
+                break
+            if partition in self.leases:
+                continue
+            lease = storage.redis.lock(
+                self.lease_key.format(partition),
+                timeout=settings.UPDATE_QUEUE_LEASE_TTL,
+            )
+            if await lease.acquire(blocking=False):
+                self.leases[partition] = lease
+                self.tasks[partition] = asyncio.create_task(
+                    self.consume(partition, lease),
+                )
+
+    async def consume(self, partition: int, lease: Lock) -> None:
+        logger.info(f'Partition {partition} was taken by {self.consumer}')
+        try:
+            await self.read(partition)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(
+                f'Partition {partition} failed: '
+                f'{e.__class__.__name__}: {str(e)}',
+            )
+        finally:
+            self.leases.pop(partition, None)
+            self.tasks.pop(partition, None)
+            self.stopping.discard(partition)
+            with suppress(LockError, RedisError):
+                await lease.release()
+
+    async def read(self, partition: int) -> None:
+        stream = self.queue.get_stream(partition)
+        try:
+            await storage.redis.xgroup_create(
+                stream,
+                self.queue.group,
+                id='0',
+                mkstream=True,
+            )
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+        # pending entries of this consumer are read first,
+        # then the worker switches to new entries
+        last_id = '0'
+        claimed_at = 0
+        while partition not in self.stopping:
+            # entries of a dead worker become idle enough to be claimed
+            # a while after the partition was taken over
+            now = time.monotonic()
+            if now - claimed_at > settings.UPDATE_QUEUE_CLAIM_IDLE_TIME / 1000:
+                await self.claim(stream)
+                claimed_at = now
+
+            response = await storage.redis.xreadgroup(
+                self.queue.group,
+                self.consumer,
+                {stream: last_id},
+                count=settings.UPDATE_QUEUE_BATCH_SIZE,
+                block=None if last_id == '0' else 5000,
+            )
+            entries = response[0][1] if response else []
+            if not entries:
+                last_id = '>'
+                continue
+            await self.handle_entries(stream, entries)
+
+    async def claim(self, stream: str) -> None:
+        start_id = '0-0'
+        while True:
+            start_id, entries, *_ = await storage.redis.xautoclaim(
+                stream,
+                self.queue.group,
+                self.consumer,
+                min_idle_time=settings.UPDATE_QUEUE_CLAIM_IDLE_TIME,
+                start_id=start_id,
+                count=settings.UPDATE_QUEUE_BATCH_SIZE,
+            )
+            if entries:
+                logger.info(
+                    f'{len(entries)} pending updates of {stream} '
+                    f'were claimed by {self.consumer}',
+                )
+                await self.handle_entries(stream, entries)
+            if start_id in (b'0-0', '0-0'):
+                return
+
+    async def handle_entries(self, stream: str, entries: list) -> None:
+        # updates of different users are handled concurrently,
+        # updates of one user keep their order
+        by_user = defaultdict(list)
+        for _, fields in entries:
+            if not fields:
+                # the entry was trimmed from the stream
+                continue
+            update = Update.model_validate_json(
+                fields[b'update'],
+                context={'bot': self.bot},
+            )
+            by_user[self.queue.get_user_id(update)].append(update)
+
+        await asyncio.gather(
+            *(self.handle_updates(updates) for updates in by_user.values()),
+        )
+        await storage.redis.xack(
+            stream,
+            self.queue.group,
+            *(entry_id for entry_id, _ in entries),
+        )
+
+    async def handle_updates(self, updates: list[Update]) -> None:
+        for update in updates:
+            try:
+                await self.dispatcher.feed_update(self.bot, update)
+            except Exception as e:
+                logger.exception(
+                    f'Update id={update.update_id} failed: '
+                    f'{e.__class__.__name__}: {str(e)}',
+                )
+
+
+class UpdateQueueRequestHandler(SimpleRequestHandler):
+    """Webhook handler that puts updates to the queue
+    instead of handling them.
+    """
+
+    def __init__(self, queue: UpdateQueue, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queue = queue
+
+    async def handle(self, request: web.Request) -> web.Response:
+        bot = await self.resolve_bot(request)
+        if not self.verify_secret(
+                request.headers.get('X-Telegram-Bot-Api-Secret-Token', ''),
+                bot,
+        ):
+            return web.Response(body='Unauthorized', status=401)
+
+        update = Update.model_validate(
+            await request.json(loads=bot.session.json_loads),
+            context={'bot': bot},
+        )
+        await self.queue.push(update)
+        return web.json_response({})
+
+
+async def poll_to_queue(bot: Bot, queue: UpdateQueue, **kwargs) -> None:
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(
+                offset=offset,
+                timeout=30,
+                **kwargs,
+            )
+        except Exception as e:
+            logger.exception(
+                f'Cannot get updates: {e.__class__.__name__}: {str(e)}',
+            )
+            await asyncio.sleep(5)
+            continue
+
+        for update in updates:
+            await queue.push(update)
+            offset = update.update_id + 1
+
+
+update_queue = UpdateQueue()
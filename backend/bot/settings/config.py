@@ -14,8 +14,58 @@ class Settings:
     SUBSCRIBE_CHATS: list = field(
         default_factory=lambda: env.list('SUBSCRIBE_CHATS'),
     )
+    STORAGE_CHAT_ID: int | None = field(
+        default_factory=lambda: env.int('STORAGE_CHAT_ID', None),
+    )
+    USE_WEBHOOK: bool = field(
+        default_factory=lambda: env.bool('USE_WEBHOOK', False),
+    )
+    WEBHOOK_URL: str | None = field(
+        default_factory=lambda: env('WEBHOOK_URL', None),
+    )
+    WEBHOOK_SECRET: str | None = field(
+        default_factory=lambda: env('WEBHOOK_SECRET', None),
+    )
+    USE_UPDATE_QUEUE: bool = field(
+        default_factory=lambda: env.bool('USE_UPDATE_QUEUE', False),
+    )
+    DISPATCH_RATE: float = field(
+        default_factory=lambda: env.float('DISPATCH_RATE', 25),
+    )
+
+    WEBHOOK_PATH: str = field(default='/bot/webhook')
+    WEBHOOK_HOST: str = field(default='0.0.0.0')
+    WEBHOOK_PORT: int = field(default=8080)
+    METRICS_HOST: str = field(default='127.0.0.1')
+    METRICS_PORT: int = field(default=9100)
+
+    UPDATE_QUEUE_PARTITIONS: int = field(default=16)
+    UPDATE_QUEUE_MAXLEN: int = field(default=100_000)
+    UPDATE_QUEUE_BATCH_SIZE: int = field(default=100)
+    UPDATE_QUEUE_CLAIM_IDLE_TIME: int = field(default=60_000)  # ms
+    UPDATE_QUEUE_LEASE_TTL: int = field(default=30)
 
     PAGE_SIZE: int = field(default=3)
+    INLINE_PAGE_SIZE: int = field(default=20)
+    INLINE_CACHE_TIME: int = field(default=300)
     CURRENCY: str = field(default='RUB')
     MAX_AMOUNT: str = field(default=25_000_000)  # 250 000.00 ₽
-    ORDERS_FILE: str = field(default='orders.xlsx')
+    FSM_TTL: int = field(default=60 * 60 * 24 * 30)
+    CART_TTL: int = field(default=60 * 60 * 24 * 90)
+    KEYBOARD_CACHE_TTL: int = field(default=60 * 60 * 24)
+    PRODUCT_CARD_TTL: int = field(default=60 * 60 * 24)
+    INVOICE_SNAPSHOT_TTL: int = field(default=60 * 60 * 24)
+    EDIT_HASH_TTL: int = field(default=60 * 60 * 24)
+    EDIT_TOKEN_TTL: int = field(default=60 * 10)
+    CHAT_MEMBER_CACHE_TTL: int = field(default=60 * 60)
+    CHAT_MEMBER_NEGATIVE_CACHE_TTL: int = field(default=60)
+    DISPATCH_MAX_IN_FLIGHT: int = field(default=20)
+    DISPATCH_BATCH_SIZE: int = field(default=1000)
+    DISPATCH_LOG_BATCH_SIZE: int = field(default=200)
+    DISPATCH_LOCK_TIMEOUT: int = field(default=10 * 60)
+    CLIENT_ACTIVITY_FLUSH_INTERVAL: int = field(default=10)
+    SCHEDULER_CONCURRENCY: int = field(default=32)
+    SCHEDULER_SHED_QUEUE_SIZE: int = field(default=100)
+    SCHEDULER_STALE_TIME: int = field(default=5)
+    IMAGE_UPLOAD_WORKERS: int = field(default=4)
+    IMAGE_UPLOAD_BATCH_SIZE: int = field(default=100)
@@ -0,0 +1,42 @@
+from typing import Any
+
+import msgpack
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+
+
+class MsgpackRedisStorage(RedisStorage):
+    """Redis FSM storage that keeps data as msgpack instead of JSON.
+
+    Data written as JSON by the plain ``RedisStorage`` is still read,
+    it is converted on the next write.
+    """
+
+    @staticmethod
+    def encode_data(data: dict[str, Any]) -> bytes:
+        return msgpack.packb(data)
+
+    def decode_data(self, value: bytes | str | None) -> dict[str, Any]:
+        if not value:
+            return {}
+        if isinstance(value, str):
+            value = value.encode()
+        # a msgpack map never starts with "{", a JSON object always does
+        if value.startswith(b'{'):
+            return self.json_loads(value)
+        return msgpack.unpackb(value, strict_map_key=False)
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        redis_key = self.key_builder.build(key, 'data')
+        if not data:
+            await self.redis.delete(redis_key)
+            return
+        await self.redis.set(
+            redis_key,
+            self.encode_data(data),
+            ex=self.data_ttl,
+        )
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        redis_key = self.key_builder.build(key, 'data')
+        return self.decode_data(await self.redis.get(redis_key))
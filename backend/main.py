@@ -1,57 +1,87 @@
+import argparse
 import asyncio
 import os
 
 import django
-import openpyxl
 from aiogram import F
 from aiogram.types import BotCommand
+from aiogram.webhook.aiohttp_server import (
+    SimpleRequestHandler,
+    setup_application,
+)
+from aiohttp import web
 
 from bot.loader import bot, dp, logger
 from bot.settings import settings
 
 
-def init_excel():
-    if not os.path.exists(settings.ORDERS_FILE):
-        wb = openpyxl.Workbook()
-        sheet = wb.active
-        sheet.title = 'Заказы'
-        sheet.append(
-            [
-                'ID платежа',
-                'ID пользователя',
-                'ID товара',
-                'Имя пользователя',
-                'Адрес доставки',
-                'Товар',
-                'Количество',
-                'Сумма',
-                'Дата заказа',
-            ],
-        )
-        wb.save(settings.ORDERS_FILE)
-        logger.info(f'Created file {settings.ORDERS_FILE}')
-    else:
-        logger.info(f'File {settings.ORDERS_FILE} already exists')
+async def on_startup():
+    from bot.services import catalog_tree, client_activity, faq_index
 
+    await catalog_tree.start()
+    await faq_index.start()
+    await client_activity.start()
 
-async def main():
+
+async def on_shutdown():
+    from bot.services import catalog_tree, client_activity, faq_index
+
+    await catalog_tree.stop()
+    await faq_index.stop()
+    await client_activity.stop()
+
+
+def setup() -> None:
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
     django.setup()
 
-    init_excel()
-
-    from bot.handlers import cart, catalog, commands, errors, inline
+    from bot.handlers import (
+        cart,
+        catalog,
+        chat_member,
+        commands,
+        errors,
+        inline,
+    )
+    from bot.middlewares import (
+        BufferedFSMContextMiddleware,
+        ChatMemberMiddleware,
+        ClientActivityMiddleware,
+        EditCoalescingMiddleware,
+        MetricsMiddleware,
+        UpdateSchedulerMiddleware,
+    )
 
     dp.include_routers(
+        chat_member.router,
         commands.router,
         catalog.router,
         cart.router,
         inline.router,
         errors.router,
     )
+    metrics = MetricsMiddleware()
+    dp.update.outer_middleware(metrics)
+    for name, observer in dp.observers.items():
+        if name != 'update':
+            observer.middleware(metrics)
+    # page flips get their coalescing tokens before they wait
+    # in the scheduler, so FSM data is loaded only when the update
+    # is about to be handled
+    edit_coalescing = EditCoalescingMiddleware()
+    dp.update.outer_middleware(edit_coalescing)
+    dp.update.outer_middleware(UpdateSchedulerMiddleware())
+    dp.fsm = BufferedFSMContextMiddleware.from_middleware(dp.fsm)
+    dp.update.outer_middleware(dp.fsm)
+    dp.update.outer_middleware(ClientActivityMiddleware())
+    dp.callback_query.outer_middleware(edit_coalescing)
     dp.message.filter(F.chat.type == 'private')
+    dp.message.outer_middleware(ChatMemberMiddleware())
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
 
-    await bot.delete_webhook(drop_pending_updates=True)
+
+async def set_commands() -> None:
     await bot.set_my_commands(
         [
             BotCommand(command='/start', description='Запустить бота'),
@@ -60,9 +90,120 @@ async def main():
         ],
     )
 
-    logger.info('Starting bot...')
-    await dp.start_polling(bot)
+
+async def set_webhook() -> None:
+    await bot.set_webhook(
+        f'{settings.WEBHOOK_URL}{settings.WEBHOOK_PATH}',
+        secret_token=settings.WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    await set_commands()
+
+
+async def create_app() -> web.Application:
+    """Webhook application, also used as an app factory by gunicorn:
+
+    gunicorn main:create_app --worker-class aiohttp.GunicornWebWorker
+    """
+    from bot.metrics import metrics_view
+    from bot.services.update_queue import (
+        UpdateQueueRequestHandler,
+        update_queue,
+    )
+
+    setup()
+    dp.startup.register(set_webhook)
+
+    app = web.Application()
+    if settings.USE_UPDATE_QUEUE:
+        handler = UpdateQueueRequestHandler(
+            update_queue,
+            dp,
+            bot,
+            secret_token=settings.WEBHOOK_SECRET,
+        )
+    else:
+        handler = SimpleRequestHandler(
+            dp,
+            bot,
+            secret_token=settings.WEBHOOK_SECRET,
+        )
+    handler.register(app, path=settings.WEBHOOK_PATH)
+    # only the webhook path is proxied by nginx
+    app.router.add_get('/metrics', metrics_view)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def main():
+    from bot.metrics import start_metrics_server
+    from bot.services.update_queue import poll_to_queue, update_queue
+
+    setup()
+
+    await bot.delete_webhook(drop_pending_updates=True)
+    await set_commands()
+    metrics_runner = await start_metrics_server(
+        settings.METRICS_HOST,
+        settings.METRICS_PORT,
+    )
+
+    try:
+        if settings.USE_UPDATE_QUEUE:
+            logger.info('Starting bot polling to the update queue...')
+            await poll_to_queue(
+                bot,
+                update_queue,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            return
+
+        logger.info('Starting bot...')
+        await dp.start_polling(bot)
+    finally:
+        await metrics_runner.cleanup()
+
+
+async def run_worker(index: int):
+    from bot.metrics import start_metrics_server
+    from bot.services.update_queue import UpdateQueueWorker, update_queue
+
+    setup()
+
+    logger.info(f'Starting update queue worker {index}...')
+    # the next ports after the one of the polling process
+    metrics_runner = await start_metrics_server(
+        settings.METRICS_HOST,
+        settings.METRICS_PORT + 1 + index,
+    )
+    await dp.emit_startup(bot=bot)
+    try:
+        await UpdateQueueWorker(
+            update_queue,
+            dp,
+            bot,
+            index=index,
+        ).run()
+    finally:
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
+        await metrics_runner.cleanup()
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    parser = argparse.ArgumentParser()
+    parser.add_argument('mode', nargs='?', choices=('worker',))
+    parser.add_argument('--index', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.mode == 'worker':
+        asyncio.run(run_worker(args.index))
+    elif settings.USE_WEBHOOK:
+        logger.info('Starting bot webhook server...')
+        web.run_app(
+            create_app(),
+            host=settings.WEBHOOK_HOST,
+            port=settings.WEBHOOK_PORT,
+        )
+    else:
+        asyncio.run(main())
@@ -1,13 +1,168 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 
 from shop import models
+from shop.exports import (
+    XLSX_CONTENT_TYPE,
+    stream_orders_csv,
+    stream_orders_xlsx,
+)
+from shop.tasks import get_dispatch_lock, send_dispatch
+from shop.utils import estimate_count
 
 admin.site.register(models.Category)
 admin.site.register(models.Client)
-admin.site.register(models.Dispatch)
 admin.site.register(models.User)
 
 
+@admin.register(models.FAQ)
+class FAQAdmin(admin.ModelAdmin):
+    list_display = ('question', 'answer')
+    search_fields = ('question',)
+
+
 @admin.register(models.Product)
 class ProductAdmin(admin.ModelAdmin):
     readonly_fields = ('image_tg_id',)
+
+
+@admin.register(models.Dispatch)
+class DispatchAdmin(admin.ModelAdmin):
+    list_display = (
+        '__str__',
+        'created_at',
+        'started_at',
+        'sent_count',
+        'failed_count',
+        'remaining_count',
+        'finished_at',
+    )
+    readonly_fields = (
+        'audience_estimate',
+        'recipients_count',
+        'sent_count',
+        'failed_count',
+        'remaining_count',
+        'started_at',
+        'finished_at',
+    )
+    actions = ('start_dispatch', 'resume_dispatch')
+
+    @admin.display(description='Примерно получателей')
+    def audience_estimate(self, obj):
+        if not obj.pk or obj.started_at:
+            return None
+        return f'~{estimate_count(obj.get_audience()):,}'
+
+    @admin.display(description='Осталось')
+    def remaining_count(self, obj):
+        if obj.recipients_count is None:
+            return None
+        return max(
+            obj.recipients_count - obj.sent_count - obj.failed_count,
+            0,
+        )
+
+    @admin.action(description='Запустить рассылку')
+    def start_dispatch(self, request, queryset):
+        for dispatch in queryset.filter(started_at__isnull=True):
+            dispatch.started_at = timezone.now()
+            dispatch.save(update_fields=['started_at'])
+            send_dispatch.delay(dispatch.pk)
+
+    @admin.action(description='Продолжить рассылку')
+    def resume_dispatch(self, request, queryset):
+        for dispatch in queryset.filter(
+                started_at__isnull=False,
+                finished_at__isnull=True,
+        ):
+            if get_dispatch_lock(dispatch.pk).locked():
+                self.message_user(
+                    request,
+                    f'Рассылка {dispatch.pk} ещё отправляется',
+                    messages.WARNING,
+                )
+                continue
+            send_dispatch.delay(dispatch.pk)
+
+
+class OrderItemInline(admin.TabularInline):
+    model = models.OrderItem
+    fields = ('product', 'title', 'price', 'count')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(models.Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'client', 'amount', 'created_at')
+    list_select_related = ('client',)
+    readonly_fields = (
+        'client',
+        'telegram_payment_charge_id',
+        'provider_payment_charge_id',
+        'delivery_address',
+        'amount',
+        'created_at',
+    )
+    date_hierarchy = 'created_at'
+    inlines = (OrderItemInline,)
+    actions = ('export_xlsx', 'export_csv')
+    # a streamed response still runs in a gunicorn worker,
+    # larger exports would outlive its timeout
+    export_max_orders = 200_000
+
+    @staticmethod
+    def get_export_filename(extension: str) -> str:
+        return f'orders_{timezone.localtime():%Y%m%d_%H%M%S}.{extension}'
+
+    def get_export_response(
+            self,
+            request,
+            queryset,
+            content,
+            *,
+            content_type: str,
+            extension: str,
+    ):
+        if estimate_count(queryset) > self.export_max_orders:
+            self.message_user(
+                request,
+                f'Слишком много заказов для выгрузки из админки '
+                f'(больше {self.export_max_orders:,}). Сузьте период '
+                f'или используйте команду manage.py export_orders.',
+                messages.ERROR,
+            )
+            return None
+        return StreamingHttpResponse(
+            content(queryset),
+            content_type=content_type,
+            headers={
+                'Content-Disposition': (
+                    f'attachment; '
+                    f'filename="{self.get_export_filename(extension)}"'
+                ),
+            },
+        )
+
+    @admin.action(description='Выгрузить в XLSX')
+    def export_xlsx(self, request, queryset):
+        return self.get_export_response(
+            request,
+            queryset,
+            stream_orders_xlsx,
+            content_type=XLSX_CONTENT_TYPE,
+            extension='xlsx',
+        )
+
+    @admin.action(description='Выгрузить в CSV')
+    def export_csv(self, request, queryset):
+        return self.get_export_response(
+            request,
+            queryset,
+            stream_orders_csv,
+            content_type='text/csv',
+            extension='csv',
+        )
@@ -0,0 +1,23 @@
+import redis
+from django.conf import settings
+
+CATALOG_CHANNEL = 'catalog:changed'
+CATALOG_VERSION_KEY = 'catalog:version'
+PRODUCT_CARD_KEY = 'product_card:{}'
+FAQ_CHANNEL = 'faq:changed'
+
+redis_client = redis.Redis.from_url(settings.REDIS_URL)
+
+
+def notify_catalog_changed() -> None:
+    version = redis_client.incr(CATALOG_VERSION_KEY)
+    redis_client.publish(CATALOG_CHANNEL, version)
+
+
+def invalidate_product_cards(*pks: int) -> None:
+    if pks:
+        redis_client.delete(*(PRODUCT_CARD_KEY.format(pk) for pk in pks))
+
+
+def notify_faq_changed() -> None:
+    redis_client.publish(FAQ_CHANNEL, 1)
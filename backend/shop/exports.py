@@ -0,0 +1,223 @@
+import csv
+import re
+import zipfile
+from collections.abc import Iterator
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.db.models import DecimalField, ExpressionWrapper, F, QuerySet
+from django.utils import timezone
+
+from shop.models import Order, OrderItem
+
+ORDER_COLUMNS = (
+    'ID платежа',
+    'ID пользователя',
+    'ID товара',
+    'Имя пользователя',
+    'Адрес доставки',
+    'Товар',
+    'Количество',
+    'Сумма',
+    'Дата заказа',
+)
+CHUNK_SIZE = 2000
+XLSX_CONTENT_TYPE = (
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+)
+XLSX_SHEET_NAME = 'Заказы'
+# the smallest set of parts a spreadsheet reader needs,
+# the sheet itself is written row by row
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/'
+        'content-types">'
+        '<Default Extension="rels" ContentType="application/'
+        'vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/'
+        '2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/'
+        '2006/main" xmlns:r="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{XLSX_SHEET_NAME}" sheetId="1" r:id="rId1"/>'
+        '</sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/'
+        '2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/'
+    '2006/main"><sheetData>'
+)
+XLSX_SHEET_END = '</sheetData></worksheet>'
+# characters that are not allowed in XML 1.0
+ILLEGAL_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class ChunkBuffer:
+    """Unseekable file that keeps written bytes until they are taken."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def filter_orders(
+        orders: QuerySet = None,
+        *,
+        date_from: date = None,
+        date_to: date = None,
+) -> QuerySet:
+    if orders is None:
+        orders = Order.objects.all()
+    if date_from:
+        orders = orders.filter(
+            created_at__gte=timezone.make_aware(
+                datetime.combine(date_from, time.min),
+            ),
+        )
+    if date_to:
+        orders = orders.filter(
+            created_at__lt=timezone.make_aware(
+                datetime.combine(date_to + timedelta(days=1), time.min),
+            ),
+        )
+    return orders
+
+
+def iter_order_rows(orders: QuerySet) -> Iterator[tuple]:
+    # .iterator() reads rows through a server-side cursor,
+    # so memory doesn't depend on the number of orders
+    rows = (
+        OrderItem.objects.filter(order__in=orders.order_by().values('pk'))
+        .annotate(
+            amount=ExpressionWrapper(
+                F('price') * F('count'),
+                output_field=DecimalField(max_digits=18, decimal_places=2),
+            ),
+        )
+        .order_by('order__created_at', 'pk')
+        .values_list(
+            'order__provider_payment_charge_id',
+            'order__client_id',
+            'product_id',
+            'order__client__username',
+            'order__delivery_address',
+            'title',
+            'count',
+            'amount',
+            'order__created_at',
+        )
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    for *row, username, address, title, count, amount, created_at in rows:
+        yield (
+            *row,
+            f'@{username}' if username else '',
+            address,
+            title,
+            count,
+            amount,
+            timezone.localtime(created_at).strftime('%Y-%m-%d %H:%M:%S'),
+        )
+
+
+def stream_orders_csv(orders: QuerySet) -> Iterator[str]:
+    writer = csv.writer(Echo())
+    yield writer.writerow(ORDER_COLUMNS)
+    for row in iter_order_rows(orders):
+        yield writer.writerow(row)
+
+
+def write_orders_csv(orders: QuerySet, file) -> None:
+    file.writelines(stream_orders_csv(orders))
+
+
+def get_xlsx_cell(value) -> str:
+    if value is None:
+        return '<c/>'
+    if isinstance(value, int | float | Decimal):
+        return f'<c><v>{value}</v></c>'
+    value = ILLEGAL_XML_CHARS.sub('', str(value))
+    return (
+        f'<c t="inlineStr"><is><t xml:space="preserve">'
+        f'{escape(value)}</t></is></c>'
+    )
+
+
+def get_xlsx_row(row: tuple) -> str:
+    return f'<row>{"".join(get_xlsx_cell(value) for value in row)}</row>'
+
+
+def stream_orders_xlsx(orders: QuerySet) -> Iterator[bytes]:
+    # the zip is written to a buffer that can't seek, so entries are
+    # followed by data descriptors and bytes go out every CHUNK_SIZE rows
+    buffer = ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, content in XLSX_PARTS.items():
+            zf.writestr(name, content)
+
+        with zf.open(
+                'xl/worksheets/sheet1.xml',
+                'w',
+                force_zip64=True,
+        ) as sheet:
+            rows = [XLSX_SHEET_START, get_xlsx_row(ORDER_COLUMNS)]
+            for row in iter_order_rows(orders):
+                rows.append(get_xlsx_row(row))
+                if len(rows) >= CHUNK_SIZE:
+                    sheet.write(''.join(rows).encode())
+                    rows.clear()
+                    if data := buffer.take():
+                        yield data
+            rows.append(XLSX_SHEET_END)
+            sheet.write(''.join(rows).encode())
+    yield buffer.take()
+
+
+def write_orders_xlsx(orders: QuerySet, file) -> None:
+    for chunk in stream_orders_xlsx(orders):
+        file.write(chunk)
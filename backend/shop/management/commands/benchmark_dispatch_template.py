@@ -0,0 +1,51 @@
+import time
+from string import Template
+
+from django.core.management import BaseCommand
+
+from bot.services.dispatch_template import DispatchTemplate
+from shop.models import Client
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость подстановки переменных в текст рассылки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=1_000_000)
+        parser.add_argument(
+            '--text',
+            default='Привет, ${first_name}! Для @${username} есть скидка',
+        )
+
+    def handle(self, *args, **options):
+        text = options['text']
+        rows = [
+            (pk, f'first_name_{pk}', None, f'username_{pk}', False)
+            for pk in range(options['recipients'])
+        ]
+
+        start = time.perf_counter()
+        for row in rows:
+            client = Client(*row)
+            Template(text).safe_substitute(client.to_dict())
+        per_client = time.perf_counter() - start
+
+        template = DispatchTemplate(text)
+        indexes = [
+            DispatchTemplate.fields.index(field)
+            for field in template.used_fields
+        ]
+        projected = [tuple(row[i] for i in indexes) for row in rows]
+
+        start = time.perf_counter()
+        for values in projected:
+            if not template.is_static:
+                template.render(values)
+        compiled = time.perf_counter() - start
+
+        self.stdout.write(
+            f'Recipients: {len(rows)}\n'
+            f'Used fields: {", ".join(template.used_fields) or "-"}\n'
+            f'Template per client: {per_client:.2f}s\n'
+            f'Compiled template: {compiled:.2f}s',
+        )
@@ -0,0 +1,75 @@
+import difflib
+import random
+import statistics
+import time
+
+from django.core.management import BaseCommand
+
+from bot.services.faq_index import FAQEntry, FAQIndex
+
+WORDS = (
+    'заказ', 'оплата', 'доставка', 'возврат', 'гарантия', 'товар',
+    'поддержка', 'карта', 'бренд', 'скидка', 'корзина', 'регион',
+    'трек-номер', 'брак', 'характеристики', 'отмена', 'адрес', 'курьер',
+)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает задержку поиска по FAQ через difflib и индекс'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', type=int, default=5000)
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        questions = list(
+            {
+                ' '.join(rnd.choices(WORDS, k=rnd.randint(3, 7))) + '?'
+                for _ in range(options['entries'])
+            },
+        )
+        # queries are typed prefixes of questions, like in inline mode
+        queries = [
+            question[:rnd.randint(3, len(question))]
+            for question in rnd.choices(questions, k=options['queries'])
+        ]
+
+        difflib_timings = self.measure(
+            lambda q: difflib.get_close_matches(q, questions, cutoff=0.2),
+            queries,
+        )
+
+        start = time.perf_counter()
+        index = FAQIndex(
+            [FAQEntry(i, q, '') for i, q in enumerate(questions)],
+            cache_size=0,
+        )
+        build_time = time.perf_counter() - start
+        index_timings = self.measure(index.search, queries)
+
+        self.stdout.write(
+            f'Entries: {len(questions)}, queries: {len(queries)}\n'
+            f'Index build: {build_time * 1000:.1f}ms\n'
+            f'difflib: {self.format(difflib_timings)}\n'
+            f'index: {self.format(index_timings)}',
+        )
+
+    @staticmethod
+    def measure(search, queries: list[str]) -> list[float]:
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            search(query)
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    @staticmethod
+    def format(timings: list[float]) -> str:
+        quantiles = statistics.quantiles(timings, n=100)
+        return (
+            f'p50={quantiles[49] * 1000:.2f}ms '
+            f'p95={quantiles[94] * 1000:.2f}ms '
+            f'p99={quantiles[98] * 1000:.2f}ms'
+        )
@@ -0,0 +1,37 @@
+from datetime import date
+
+from django.core.management import BaseCommand
+
+from shop.exports import filter_orders, write_orders_csv, write_orders_xlsx
+
+
+class Command(BaseCommand):
+    help = 'Выгружает заказы в XLSX или CSV файл'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output')
+        parser.add_argument(
+            '--format',
+            choices=('xlsx', 'csv'),
+            default='xlsx',
+        )
+        parser.add_argument('--date-from', type=date.fromisoformat)
+        parser.add_argument('--date-to', type=date.fromisoformat)
+
+    def handle(self, *args, **options):
+        orders = filter_orders(
+            date_from=options['date_from'],
+            date_to=options['date_to'],
+        )
+        if options['format'] == 'csv':
+            with open(
+                    options['output'],
+                    'w',
+                    newline='',
+                    encoding='utf-8-sig',
+            ) as f:
+                write_orders_csv(orders, f)
+        else:
+            with open(options['output'], 'wb') as f:
+                write_orders_xlsx(orders, f)
+        self.stdout.write(f'Orders were exported to {options["output"]}')
@@ -0,0 +1,42 @@
+import asyncio
+
+from django.core.management import BaseCommand
+
+from bot.loader import storage
+from bot.services import carts
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит корзины из данных FSM в отдельные хэши Redis. '
+        'Запускать при остановленном боте'
+    )
+
+    def handle(self, *args, **options):
+        async def main():
+            migrated = 0
+            async for key in storage.redis.scan_iter('fsm:*:data'):
+                data = storage.decode_data(await storage.redis.get(key))
+                cart = data.pop('cart', None)
+                if cart is None:
+                    continue
+
+                # keys are built as fsm:<chat_id>:<user_id>:data
+                user_id = int(key.decode().split(':')[-2])
+                await carts.update(
+                    user_id,
+                    {
+                        int(product_id): count
+                        for product_id, count in cart.items()
+                    },
+                )
+                await storage.redis.set(
+                    key,
+                    storage.encode_data(data),
+                    ex=storage.data_ttl,
+                )
+                migrated += 1
+            return migrated
+
+        migrated = asyncio.run(main())
+        self.stdout.write(f'Migrated {migrated} carts')
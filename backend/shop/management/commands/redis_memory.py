@@ -0,0 +1,65 @@
+import re
+from collections import defaultdict
+
+from django.core.management import BaseCommand
+
+from shop.cache import redis_client
+
+
+def get_key_family(key: str) -> str:
+    # ids, user ids and tokens are replaced, so fsm:1:1:data
+    # and fsm:2:2:data belong to the same family fsm:*:*:data
+    return ':'.join(
+        '*' if re.search(r'\d', part) else part for part in key.split(':')
+    )
+
+
+class Command(BaseCommand):
+    help = 'Показывает, сколько памяти Redis занимают ключи разных типов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--match', default='*')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        keys_count = defaultdict(int)
+        memory = defaultdict(int)
+
+        batch = []
+        for key in redis_client.scan_iter(
+                match=options['match'],
+                count=options['batch_size'],
+        ):
+            batch.append(key)
+            if len(batch) >= options['batch_size']:
+                self.measure(batch, keys_count, memory)
+                batch = []
+        self.measure(batch, keys_count, memory)
+
+        self.stdout.write(f'{"Family":<50} {"Keys":>10} {"Bytes":>14} Avg')
+        for family, size in sorted(
+                memory.items(),
+                key=lambda item: item[1],
+                reverse=True,
+        ):
+            count = keys_count[family]
+            self.stdout.write(
+                f'{family:<50} {count:>10} {size:>14} {size // count}',
+            )
+        self.stdout.write(
+            f'{"Total":<50} {sum(keys_count.values()):>10} '
+            f'{sum(memory.values()):>14}',
+        )
+
+    @staticmethod
+    def measure(keys: list[bytes], keys_count: dict, memory: dict) -> None:
+        if not keys:
+            return
+        with redis_client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.memory_usage(key)
+            sizes = pipe.execute()
+        for key, size in zip(keys, sizes, strict=True):
+            family = get_key_family(key.decode(errors='replace'))
+            keys_count[family] += 1
+            memory[family] += size or 0
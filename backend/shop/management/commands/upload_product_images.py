@@ -0,0 +1,30 @@
+import asyncio
+
+from django.core.management import BaseCommand
+
+from bot.loader import bot
+from bot.services.image_uploader import upload_product_images
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает фото товаров без ID фото в телеграм в чат-хранилище '
+        'и сохраняет полученные ID'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int)
+        parser.add_argument('--batch-size', type=int)
+
+    def handle(self, *args, **options):
+        async def main():
+            try:
+                return await upload_product_images(
+                    workers=options['workers'],
+                    batch_size=options['batch_size'],
+                )
+            finally:
+                await bot.session.close()
+
+        uploaded = asyncio.run(main())
+        self.stdout.write(f'Uploaded images of {uploaded} products')
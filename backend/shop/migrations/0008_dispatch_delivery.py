@@ -0,0 +1,39 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_category_product_title_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dispatch',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Завершена'),
+        ),
+        migrations.AddField(
+            model_name='dispatch',
+            name='recipients_count',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Получателей'),
+        ),
+        migrations.CreateModel(
+            name='DispatchDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('sent', 'Отправлено'), ('failed', 'Ошибка')], max_length=16, verbose_name='Статус')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='shop.client', verbose_name='Клиент')),
+                ('dispatch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='shop.dispatch', verbose_name='Рассылка')),
+            ],
+            options={
+                'verbose_name': 'Доставка рассылки',
+                'verbose_name_plural': 'Доставки рассылок',
+                'constraints': [models.UniqueConstraint(fields=('dispatch', 'client'), name='unique_dispatch_delivery')],
+            },
+        ),
+    ]
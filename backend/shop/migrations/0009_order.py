@@ -0,0 +1,46 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_dispatch_delivery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('telegram_payment_charge_id', models.CharField(max_length=255, unique=True, verbose_name='ID платежа в телеграм')),
+                ('provider_payment_charge_id', models.CharField(max_length=255, verbose_name='ID платежа')),
+                ('delivery_address', models.TextField(verbose_name='Адрес доставки')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=11, verbose_name='Сумма')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата заказа')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='orders', to='shop.client', verbose_name='Клиент')),
+            ],
+            options={
+                'verbose_name': 'Заказ',
+                'verbose_name_plural': 'Заказы',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255, verbose_name='Название')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=9, verbose_name='Цена')),
+                ('count', models.PositiveIntegerField(verbose_name='Количество')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='shop.order', verbose_name='Заказ')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_items', to='shop.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Товар заказа',
+                'verbose_name_plural': 'Товары заказа',
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FAQ',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question', models.CharField(max_length=255, unique=True, verbose_name='Вопрос')),
+                ('answer', models.TextField(verbose_name='Ответ')),
+            ],
+            options={
+                'verbose_name': 'Частый вопрос',
+                'verbose_name_plural': 'Частые вопросы',
+                'ordering': ['question'],
+            },
+        ),
+    ]
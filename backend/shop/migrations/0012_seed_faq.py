@@ -1,4 +1,9 @@
-FAQ = {
+# Generated by Django 5.1.6 on 2026-10-18 19:41
+
+from django.db import migrations
+
+
+FAQ_ENTRIES = {
     'как оформить заказ?':
         'Перейдите в каталог - /catalog, затем выберите товар,'
         'добавьте его в корзину и нажмите Оплатить всю корзину ',
@@ -30,3 +35,31 @@ FAQ = {
     'где можно посмотреть характеристики товаров?':
         'У каждого товара есть подробное описание.',
 }
+
+
+def seed_faq(apps, schema_editor):
+    FAQ = apps.get_model('shop', 'FAQ')
+    FAQ.objects.bulk_create(
+        [
+            FAQ(question=question, answer=answer)
+            for question, answer in FAQ_ENTRIES.items()
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def delete_faq(apps, schema_editor):
+    apps.get_model('shop', 'FAQ').objects.filter(
+        question__in=FAQ_ENTRIES.keys(),
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_faq'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_faq, delete_faq),
+    ]
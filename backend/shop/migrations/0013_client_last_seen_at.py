@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_seed_faq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последняя активность'),
+        ),
+    ]
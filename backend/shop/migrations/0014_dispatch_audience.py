@@ -0,0 +1,59 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_existing_started(apps, schema_editor):
+    # dispatches created before drafts were sent right away
+    apps.get_model('shop', 'Dispatch').objects.update(
+        started_at=models.F('created_at'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_client_last_seen_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dispatch',
+            name='active_within_days',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Были активны за последние N дней'),
+        ),
+        migrations.AddField(
+            model_name='dispatch',
+            name='bought_from_category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='dispatches', to='shop.category', verbose_name='Покупали товары из категории'),
+        ),
+        migrations.AddField(
+            model_name='dispatch',
+            name='only_premium',
+            field=models.BooleanField(default=False, verbose_name='Только клиентам с премиумом'),
+        ),
+        migrations.AddField(
+            model_name='dispatch',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Запущена'),
+        ),
+        migrations.AlterField(
+            model_name='client',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='client',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Последняя активность'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(condition=models.Q(('is_premium', True)), fields=['id'], name='client_premium_idx'),
+        ),
+        migrations.RunPython(
+            mark_existing_started,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.6 on 2026-10-18 20:15
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def count_deliveries(apps, schema_editor):
+    Dispatch = apps.get_model('shop', 'Dispatch')
+    for dispatch in Dispatch.objects.annotate(
+            sent=Count('deliveries', filter=Q(deliveries__status='sent')),
+            failed=Count('deliveries', filter=Q(deliveries__status='failed')),
+    ):
+        dispatch.sent_count = dispatch.sent
+        dispatch.failed_count = dispatch.failed
+        dispatch.save(update_fields=['sent_count', 'failed_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_dispatch_audience'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dispatch',
+            name='failed_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Ошибок'),
+        ),
+        migrations.AddField(
+            model_name='dispatch',
+            name='sent_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Отправлено'),
+        ),
+        migrations.RunPython(
+            count_deliveries,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -1,7 +1,13 @@
+from datetime import timedelta
+from decimal import Decimal
+
 from aiogram import types
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import AbstractUser
-from django.core.exceptions import ObjectDoesNotExist
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import IntegrityError, connection, models, transaction
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -16,7 +22,7 @@ class ClientManager(models.Manager):
             id=user.id,
             first_name=user.first_name,
             last_name=user.last_name,
-            username=user.username,
+            username=user.username or '',
             is_premium=user.is_premium or False,
         )
 
@@ -24,7 +30,7 @@ class ClientManager(models.Manager):
         await self.filter(pk=user.id).aupdate(
             first_name=user.first_name,
             last_name=user.last_name,
-            username=user.username,
+            username=user.username or '',
             is_premium=user.is_premium or False,
         )
 
@@ -32,13 +38,49 @@ class ClientManager(models.Manager):
             self,
             user: types.User,
     ) -> tuple['Client', bool]:
-        try:
-            client = await self.aget(id=user.id)
-            await self.update_from_tg_user(user)
-            await client.arefresh_from_db()
-            return client, False
-        except ObjectDoesNotExist:
-            return await self.from_tg_user(user), True
+        # a single INSERT ... ON CONFLICT statement, so parallel calls
+        # for one user can't fail on the primary key; xmax is 0 only
+        # for the rows inserted by the statement
+        fields = self.model._meta.concrete_fields
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        returning = ', '.join(
+            connection.ops.quote_name(field.column) for field in fields
+        )
+        sql = (
+            f'INSERT INTO {table} '
+            f'(id, first_name, last_name, username, is_premium, created_at) '
+            f'VALUES (%s, %s, %s, %s, %s, %s) '
+            f'ON CONFLICT (id) DO UPDATE SET '
+            f'first_name = EXCLUDED.first_name, '
+            f'last_name = EXCLUDED.last_name, '
+            f'username = EXCLUDED.username, '
+            f'is_premium = EXCLUDED.is_premium '
+            f'RETURNING {returning}, (xmax = 0)'
+        )
+        params = (
+            user.id,
+            user.first_name,
+            user.last_name,
+            user.username or '',
+            user.is_premium or False,
+            timezone.now(),
+        )
+
+        @sync_to_async
+        def upsert() -> tuple[Client, bool]:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                *row, created = cursor.fetchone()
+            return (
+                self.model.from_db(
+                    self.db,
+                    [field.attname for field in fields],
+                    row,
+                ),
+                created,
+            )
+
+        return await upsert()
 
 
 class Client(models.Model):
@@ -58,13 +100,26 @@ class Client(models.Model):
         verbose_name='Есть премиум',
         default=False,
     )
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    last_seen_at = models.DateTimeField(
+        verbose_name='Последняя активность',
+        null=True,
+        blank=True,
+        db_index=True,
+    )
     objects = ClientManager()
 
     class Meta:
         verbose_name = 'Клиент'
         verbose_name_plural = 'Клиенты'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(is_premium=True),
+                name='client_premium_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'@{self.username}'
@@ -79,6 +134,24 @@ class Client(models.Model):
         }
 
 
+class CategoryManager(models.Manager):
+    def subtree_ids(self, pk: int) -> list[int]:
+        # the category and all its descendants in one recursive query,
+        # UNION drops repeated rows, so a cycle can't loop forever
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        sql = (
+            f'WITH RECURSIVE subtree(id) AS ('
+            f'SELECT id FROM {table} WHERE id = %s '
+            f'UNION '
+            f'SELECT category.id FROM {table} category '
+            f'JOIN subtree ON category.parent_category_id = subtree.id'
+            f') SELECT id FROM subtree'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, (pk,))
+            return [pk for pk, in cursor.fetchall()]
+
+
 class Category(models.Model):
     title = models.CharField(verbose_name='Название', max_length=255)
     parent_category = models.ForeignKey(
@@ -89,12 +162,18 @@ class Category(models.Model):
         blank=True,
         verbose_name='Главная категория',
     )
-    objects: models.Manager
+    objects = CategoryManager()
 
     class Meta:
         verbose_name = 'Категория'
         verbose_name_plural = 'Категории'
         ordering = ['title']
+        indexes = [
+            models.Index(
+                fields=['parent_category', 'title', 'id'],
+                name='category_parent_title_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -120,24 +199,212 @@ class Product(models.Model):
         'products',
         verbose_name='Категория',
     )
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('title', weight='A', config='russian')
+            + SearchVector('description', weight='B', config='russian')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
     objects: models.Manager
 
     class Meta:
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
         ordering = ['title']
+        indexes = [
+            models.Index(
+                fields=['category', 'title', 'id'],
+                name='product_category_title_idx',
+            ),
+            GinIndex(
+                fields=['search_vector'],
+                name='product_search_vector_idx',
+            ),
+            GinIndex(
+                fields=['title'],
+                name='product_title_trgm_idx',
+                opclasses=['gin_trgm_ops'],
+            ),
+        ]
 
     def __str__(self):
         return f'{self.title} ({int(self.price):,} ₽)'
 
 
+class OrderManager(models.Manager):
+    async def create_from_payment(
+            self,
+            *,
+            client: Client,
+            payment: types.SuccessfulPayment,
+            delivery_address: str,
+            items: list['OrderItem'],
+    ) -> tuple['Order', bool]:
+        @sync_to_async
+        def create() -> tuple[Order, bool]:
+            try:
+                with transaction.atomic():
+                    order = self.create(
+                        client=client,
+                        telegram_payment_charge_id=(
+                            payment.telegram_payment_charge_id
+                        ),
+                        provider_payment_charge_id=(
+                            payment.provider_payment_charge_id
+                        ),
+                        delivery_address=delivery_address,
+                        amount=Decimal(payment.total_amount) / 100,
+                    )
+                    # products may be deleted after the invoice was sent,
+                    # the items keep their titles and prices
+                    product_ids = set(
+                        Product.objects.filter(
+                            pk__in=[item.product_id for item in items],
+                        ).values_list('pk', flat=True),
+                    )
+                    for item in items:
+                        item.order = order
+                        if item.product_id not in product_ids:
+                            item.product_id = None
+                    OrderItem.objects.bulk_create(items)
+            except IntegrityError:
+                # telegram may deliver the same payment again
+                order = self.filter(
+                    telegram_payment_charge_id=(
+                        payment.telegram_payment_charge_id
+                    ),
+                ).first()
+                if order is None:
+                    raise
+                return order, False
+            return order, True
+
+        return await create()
+
+
+class Order(models.Model):
+    client = models.ForeignKey(
+        Client,
+        models.PROTECT,
+        'orders',
+        verbose_name='Клиент',
+    )
+    telegram_payment_charge_id = models.CharField(
+        verbose_name='ID платежа в телеграм',
+        max_length=255,
+        unique=True,
+    )
+    provider_payment_charge_id = models.CharField(
+        verbose_name='ID платежа',
+        max_length=255,
+    )
+    delivery_address = models.TextField(verbose_name='Адрес доставки')
+    amount = models.DecimalField(
+        verbose_name='Сумма',
+        max_digits=11,
+        decimal_places=2,
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Дата заказа',
+        auto_now_add=True,
+        db_index=True,
+    )
+    objects = OrderManager()
+
+    class Meta:
+        verbose_name = 'Заказ'
+        verbose_name_plural = 'Заказы'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'Заказ №{self.pk}'
+
+
+class OrderItem(models.Model):
+    order = models.ForeignKey(
+        Order,
+        models.CASCADE,
+        'items',
+        verbose_name='Заказ',
+    )
+    product = models.ForeignKey(
+        Product,
+        models.SET_NULL,
+        'order_items',
+        null=True,
+        blank=True,
+        verbose_name='Товар',
+    )
+    title = models.CharField(verbose_name='Название', max_length=255)
+    price = models.DecimalField(
+        verbose_name='Цена',
+        max_digits=9,
+        decimal_places=2,
+    )
+    count = models.PositiveIntegerField(verbose_name='Количество')
+    objects: models.Manager
+
+    class Meta:
+        verbose_name = 'Товар заказа'
+        verbose_name_plural = 'Товары заказа'
+
+    def __str__(self):
+        return f'{self.title} ({self.count} шт.)'
+
+    @property
+    def amount(self) -> Decimal:
+        return self.price * self.count
+
+
 class Dispatch(models.Model):
     text = models.TextField(
         verbose_name='Текст',
         help_text='Вы можете использовать переменные: '
                   '${id}, ${username}, ${first_name}, ${last_name}',
     )
+    only_premium = models.BooleanField(
+        verbose_name='Только клиентам с премиумом',
+        default=False,
+    )
+    active_within_days = models.PositiveIntegerField(
+        verbose_name='Были активны за последние N дней',
+        null=True,
+        blank=True,
+    )
+    bought_from_category = models.ForeignKey(
+        Category,
+        models.SET_NULL,
+        'dispatches',
+        null=True,
+        blank=True,
+        verbose_name='Покупали товары из категории',
+    )
+    recipients_count = models.PositiveIntegerField(
+        verbose_name='Получателей',
+        null=True,
+        blank=True,
+    )
+    sent_count = models.PositiveIntegerField(
+        verbose_name='Отправлено',
+        default=0,
+    )
+    failed_count = models.PositiveIntegerField(
+        verbose_name='Ошибок',
+        default=0,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(
+        verbose_name='Запущена',
+        null=True,
+        blank=True,
+    )
+    finished_at = models.DateTimeField(
+        verbose_name='Завершена',
+        null=True,
+        blank=True,
+    )
     objects: models.Manager
 
     def __str__(self):
@@ -146,3 +413,83 @@ class Dispatch(models.Model):
     class Meta:
         verbose_name = 'Рассылка'
         verbose_name_plural = 'Рассылки'
+
+    def get_audience(self) -> models.QuerySet:
+        clients = Client.objects.order_by()
+        if self.only_premium:
+            clients = clients.filter(is_premium=True)
+        if self.active_within_days:
+            clients = clients.filter(
+                last_seen_at__gte=(
+                    timezone.now() - timedelta(days=self.active_within_days)
+                ),
+            )
+        if self.bought_from_category_id:
+            clients = clients.filter(
+                models.Exists(
+                    OrderItem.objects.filter(
+                        order__client=models.OuterRef('pk'),
+                        product__category__in=Category.objects.subtree_ids(
+                            self.bought_from_category_id,
+                        ),
+                    ),
+                ),
+            )
+        return clients
+
+
+class DispatchDelivery(models.Model):
+    class Status(models.TextChoices):
+        SENT = 'sent', 'Отправлено'
+        FAILED = 'failed', 'Ошибка'
+
+    dispatch = models.ForeignKey(
+        Dispatch,
+        models.CASCADE,
+        'deliveries',
+        verbose_name='Рассылка',
+    )
+    client = models.ForeignKey(
+        Client,
+        models.CASCADE,
+        'deliveries',
+        verbose_name='Клиент',
+    )
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=16,
+        choices=Status,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    objects: models.Manager
+
+    class Meta:
+        verbose_name = 'Доставка рассылки'
+        verbose_name_plural = 'Доставки рассылок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dispatch', 'client'],
+                name='unique_dispatch_delivery',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.dispatch_id} -> {self.client_id}: {self.status}'
+
+
+class FAQ(models.Model):
+    question = models.CharField(
+        verbose_name='Вопрос',
+        max_length=255,
+        unique=True,
+    )
+    answer = models.TextField(verbose_name='Ответ')
+    objects: models.Manager
+
+    class Meta:
+        verbose_name = 'Частый вопрос'
+        verbose_name_plural = 'Частые вопросы'
+        ordering = ['question']
+
+    def __str__(self):
+        return self.question
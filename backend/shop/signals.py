@@ -1,16 +1,39 @@
-import logging
-
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-from shop.models import Dispatch
-from shop.tasks import send_dispatch
+from shop.cache import (
+    invalidate_product_cards,
+    notify_catalog_changed,
+    notify_faq_changed,
+)
+from shop.models import FAQ, Category, Product
+from shop.tasks import warm_product_images
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def after_catalog_change(sender, instance, **kwargs):
+    transaction.on_commit(notify_catalog_changed)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def after_product_change(sender, instance, **kwargs):
+    # delete() resets instance.pk before the transaction commits
+    pk = instance.pk
+    transaction.on_commit(lambda: invalidate_product_cards(pk))
+
 
-logger = logging.getLogger(__name__)
+@receiver(post_save, sender=Product)
+def after_product_save(sender, instance, **kwargs):
+    if not instance.image_tg_id:
+        transaction.on_commit(warm_product_images.delay)
 
 
-@receiver(post_save, sender=Dispatch)
-def after_dispatch_create(sender, instance, created, **kwargs):
-    if created:
-        logger.info(f'Dispatch id={instance.pk} was created')
-        send_dispatch.delay(instance.text)
+@receiver(post_save, sender=FAQ)
+@receiver(post_delete, sender=FAQ)
+def after_faq_change(sender, instance, **kwargs):
+    transaction.on_commit(notify_faq_changed)
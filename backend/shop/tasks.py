@@ -1,44 +1,107 @@
 import asyncio
-from string import Template
+from collections.abc import AsyncIterator
 
-from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from celery import shared_task
 from celery.utils.log import get_task_logger
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from redis.lock import Lock
 
 from bot.loader import bot
-from shop.models import Client
+from bot.services.broadcaster import Broadcaster, DeliveryLog
+from bot.services.dispatch_template import DispatchTemplate
+from bot.services.image_uploader import upload_product_images
+from bot.settings import settings
+from shop.cache import redis_client
+from shop.models import Dispatch, DispatchDelivery
 
 task_logger = get_task_logger(__name__)
 
 
-async def send_message(client: Client, text):
-    text = Template(text).safe_substitute(client.to_dict())
+def get_dispatch_lock(dispatch_id: int) -> Lock:
+    return redis_client.lock(
+        f'lock:send_dispatch:{dispatch_id}',
+        timeout=settings.DISPATCH_LOCK_TIMEOUT,
+    )
 
-    try:
-        await bot.send_message(client.pk, text)
-    except TelegramRetryAfter as e:
-        task_logger.info(
-            f'Cannot send a message to user (id={client.pk}) '
-            f'because of rate limit',
-        )
-        await asyncio.sleep(e.retry_after)
-        await send_message(client, text)
-    except TelegramBadRequest as e:
-        task_logger.info(
-            f'Cannot send a message to user (id={client.pk}) '
-            f'because of an {e.__class__.__name__} error: {str(e)}',
-        )
+
+async def keep_lock(
+        lock: Lock,
+        messages: AsyncIterator[tuple[int, str]],
+) -> AsyncIterator[tuple[int, str]]:
+    # the lock is renewed while messages are sent, so it expires soon
+    # only after the worker has died; reacquire raises if it was lost
+    loop = asyncio.get_running_loop()
+    renewed_at = loop.time()
+    async for message in messages:
+        if loop.time() - renewed_at > settings.DISPATCH_LOCK_TIMEOUT / 3:
+            lock.reacquire()
+            renewed_at = loop.time()
+        yield message
 
 
 @shared_task
-def send_dispatch(text: str):
-    async def main():
-        await asyncio.wait(
-            [
-                asyncio.create_task(send_message(client, text))
-                async for client in Client.objects.all()
-            ],
-        )
+def send_dispatch(dispatch_id: int):
+    # one task per dispatch, deliveries are saved in batches,
+    # so a second task would send the messages again
+    lock = get_dispatch_lock(dispatch_id)
+    if not lock.acquire(blocking=False):
+        task_logger.info(f'Dispatch id={dispatch_id} is already being sent')
+        return
+
+    try:
+        _send_dispatch(dispatch_id, lock)
+    finally:
+        lock.release()
+
+
+def _send_dispatch(dispatch_id: int, lock: Lock):
+    # clients that already have a delivery record are skipped,
+    # so the task can be restarted after a worker failure
+    dispatch = Dispatch.objects.get(pk=dispatch_id)
+    audience = dispatch.get_audience()
+    clients = audience.exclude(
+        Exists(
+            DispatchDelivery.objects.filter(
+                dispatch=dispatch,
+                client=OuterRef('pk'),
+            ),
+        ),
+    )
+
+    if dispatch.recipients_count is None:
+        dispatch.recipients_count = audience.count()
+        dispatch.save(update_fields=['recipients_count'])
 
+    template = DispatchTemplate(dispatch.text)
+    broadcaster = Broadcaster(bot, log=DeliveryLog(dispatch.pk))
     loop = asyncio.get_event_loop()
-    loop.run_until_complete(main())
+    result = loop.run_until_complete(
+        broadcaster.run(keep_lock(lock, template.iter_messages(clients))),
+    )
+    task_logger.info(
+        f'Dispatch id={dispatch.pk} was sent to {result.sent} clients, '
+        f'{result.failed} failed, {result.held} held back',
+    )
+
+    if result.held:
+        # held back clients have no delivery record,
+        # resuming the dispatch sends them the message
+        return
+    dispatch.finished_at = timezone.now()
+    dispatch.save(update_fields=['finished_at'])
+
+
+@shared_task
+def warm_product_images():
+    lock = redis_client.lock('lock:warm_product_images', timeout=60 * 60)
+    if not lock.acquire(blocking=False):
+        task_logger.info('Product images are already being uploaded')
+        return
+
+    try:
+        loop = asyncio.get_event_loop()
+        uploaded = loop.run_until_complete(upload_product_images())
+        task_logger.info(f'Uploaded images of {uploaded} products')
+    finally:
+        lock.release()
@@ -1 +1,74 @@
-# Create your tests here.
+import threading
+from unittest import skipUnless
+
+from aiogram import types
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import TransactionTestCase
+
+from shop.models import Client
+
+
+@skipUnless(
+    connection.vendor == 'postgresql',
+    'the client upsert uses Postgres-only SQL',
+)
+class ClientUpsertTests(TransactionTestCase):
+    workers = 8
+
+    def upsert_concurrently(self, user: types.User) -> list:
+        barrier = threading.Barrier(self.workers)
+        results, errors = [], []
+
+        def upsert():
+            # every thread has its own database connection
+            try:
+                barrier.wait()
+                results.append(
+                    async_to_sync(
+                        Client.objects.create_or_update_from_tg_user,
+                    )(user),
+                )
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=upsert) for _ in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        return results
+
+    def test_parallel_start_creates_client_once(self):
+        user = types.User(
+            id=1,
+            is_bot=False,
+            first_name='Test',
+            username='test',
+        )
+        results = self.upsert_concurrently(user)
+
+        self.assertEqual(len(results), self.workers)
+        self.assertEqual(
+            sum(created for _, created in results),
+            1,
+        )
+        self.assertEqual(Client.objects.filter(pk=user.id).count(), 1)
+
+    def test_upsert_updates_existing_client(self):
+        Client.objects.create(id=2, first_name='Old', username='old')
+        user = types.User(id=2, is_bot=False, first_name='New')
+
+        client, created = async_to_sync(
+            Client.objects.create_or_update_from_tg_user,
+        )(user)
+
+        self.assertFalse(created)
+        self.assertEqual(client.first_name, 'New')
+        self.assertEqual(client.username, '')